@@ -1,89 +1,299 @@
+import os
+import time
+
+boot_start = time.perf_counter()  # start of the startup timing report (/startup_timing)
+
+# Green-thread backends must patch the standard library before anything else is imported (see SKETCHPAD_ASYNC_MODE)
+if os.environ.get("SKETCHPAD_ASYNC_MODE") == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif os.environ.get("SKETCHPAD_ASYNC_MODE") == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+import threading
+
 from interaction.helpers import *
+from interaction.archive import ResultArchive
+from interaction.boot import Lazy, StartupTimer
+from interaction.cache import ResultCache, result_key
+from interaction.jobs import JobQueue, QueueFullError
+from interaction.preprocessing import canvas_pixels, preprocess_canvas
+from interaction.results import ResultStore
+from interaction.rooms import DrawingRooms, room_name
+from interaction.strokes import StrokeAggregator, legacy_room, read_point
 
 # Flask application with WebSocket support for real-time interaction.
 # Handles image processing, model execution, and collaborative drawing.
 
 
+def offload_blocking():
+    """Returns how the batch worker hands the forward pass to an OS thread under a green-thread backend (None otherwise)."""
+    if socketio_async_mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute
+    if socketio_async_mode == "gevent":
+        from gevent import get_hub
+        return lambda fn, *args: get_hub().threadpool.apply(fn, args)
+    return None
+
+
+# torch and the generator code are imported with the first model use (or by the pre-warm thread), not at the start
+def create_registry():
+    from interaction.registry import ModelRegistry
+    return ModelRegistry(model_target, memory_budget=model_memory_budget)
+
+def create_engine():
+    from interaction.inference import InferenceEngine
+    return InferenceEngine(registry.resolve())
+
+def create_scheduler():
+    from interaction.batching import BatchScheduler
+    return BatchScheduler(engine.resolve(), batch_max_size, batch_max_wait, offload_blocking())
+
+def prewarm(model_name):
+    """Loads a generator and runs a blank sketch through it, so the first request does not pay for the cold start."""
+    try:
+        scheduler.resolve()
+        engine.transform(model_name, Image.new("L", (256, 256), 255))
+        timer.mark(f"model {model_name} warm")
+    except Exception as e:
+        print(f"ERROR: Pre-warming model {model_name} failed: {e}")
+
+def start_prewarm():
+    """Pre-warms the selected model (see SKETCHPAD_PREWARM_MODEL) in a background thread."""
+    available = list_models(model_target)
+    model_name = available[0] if prewarm_model == "auto" and available else prewarm_model
+    if model_name in available:
+        offload = offload_blocking()  # green threads would stall all connections during the import
+        target = (lambda: offload(prewarm, model_name)) if offload else (lambda: prewarm(model_name))
+        threading.Thread(target=target, name="prewarm", daemon=True).start()
+
+
 # Initialize Flask app and WebSocket support
-cwd = os.getcwd()
+timer = StartupTimer(boot_start)
+timer.mark("imports")
 models_copied = copy_all_models_once()
+timer.mark("models synced")
+registry = Lazy(create_registry)  # loads generators lazily, LRU within the budget
+engine = Lazy(create_engine)
+scheduler = Lazy(create_scheduler)  # batches concurrent sketches per model
+cache = ResultCache(cache_memory_size, cache_disk_dir, cache_disk_size)  # skips the generator for repeated sketches
+results = ResultStore(result_store_size, result_ttl)  # per-request results, nothing is shared on disk
+archive = ResultArchive(output_image_path_app, result_index_path)  # numbered copies of all results with a SQLite index
+jobs = JobQueue(job_workers, job_queue_size, result_ttl)  # runs /jobs transformations outside the web threads
 app = Flask(__name__,template_folder="interaction/templates")
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=socketio_async_mode)
+rooms = DrawingRooms(max_rooms)  # drawing room of every client, with stroke log and snapshot per room
+strokes = StrokeAggregator(socketio, stroke_tick, stroke_encoding, on_flush=rooms.record)  # coalesces drawing points into one message per tick
+timer.mark("app ready")
+start_prewarm()
 
 @app.route('/get_models', methods=['GET'])
 def get_models():
     """Returns available model names as JSON."""
-    models = get_available_models()
-    return jsonify(models)
+    models = list_models(model_target)
+    return jsonify(models if models else ["No models found"])
 
 @app.route('/')
 def index():
     """Renders the main HTML page."""
     return render_template('index.html')
 
+def transform_input(input_img, model_name, sid, result_id=None):
+    """Runs a preprocessed sketch through the model (or the cache), stores the result and shares it with the room of `sid`."""
+    key = result_key(input_img, model_name, registry.model_version(model_name))
+    fake_png = cache.get(key)
+    if fake_png is None:
+        fake_png = encode_png(run_model(scheduler, model_name, input_img))
+        cache.put(key, fake_png)
+
+    input_png = encode_png(input_img)
+    result_id = results.add(input_png, fake_png, result_id)
+    archive.add(input_png, fake_png, result_id, model_name)
+    result = {
+        "result_id": result_id,
+        "input_image": f"/get_result/{result_id}/input",
+        "output_image": f"/get_result/{result_id}/output"
+    }
+
+    room = rooms.room_of(sid)
+    if room:
+        socketio.emit('new_result', dict(result, room=room), to=room, skip_sid=sid)
+    return result
+
 @app.route('/save_image', methods=['POST'])
 def save_image():
     """Receives an image, processes it, and runs the model transformation."""
     data = request.get_json()
     image_data, model_name = data.get('imageData'), data.get('model_selction')
+    sid = data.get('sid')  # socket of the requesting page, whose room also receives the result
     
     if not model_name:
         return jsonify({"error": "No valid model selected."}), 400
     
     image_bytes = io.BytesIO(base64.b64decode(image_data.split(",")[1]))
-    img = ensure_white_background(Image.open(image_bytes))
+    pixels = canvas_pixels(Image.open(image_bytes))
     
     try:
-        process_and_save_image(img)
-        run_model(model_name)
-        
-        return jsonify({
-            "input_image": f"/get_image/{os.path.basename(input_image_path_app)}",
-            "output_image": f"/get_image/{os.path.basename(upload_image_path_app)}"
-        })
+        input_img = Image.fromarray(preprocess_canvas(pixels))
+        return jsonify(transform_input(input_img, model_name, sid))
 
     except ValueError as e:
        
         return jsonify({"error": str(e)}), 400
 
-@app.route('/get_image/<image_name>')
-def get_image(image_name):
-    """Serves images from different directories."""
-    possible_paths = [
-        os.path.join(cwd, 'interaction', 'images','input', image_name),
-        os.path.join(cwd, 'interaction', 'images','output', image_name),
-        os.path.join(cwd, 'interaction', 'images','upload', image_name),
-    ]
-    for path in possible_paths:
-        if os.path.exists(path):
-            return send_file(path, mimetype='image/png')
-    return jsonify({"error": "Image not found."}), 404
+@app.route('/save_strokes', methods=['POST'])
+def save_strokes():
+    """Receives the drawing as stroke polylines [[xs, ys], ...], rasterizes it like the training data and runs the model transformation."""
+    data = request.get_json()
+    strokes, model_name = data.get('strokes'), data.get('model_selction')
+    sid = data.get('sid')
+
+    if not model_name:
+        return jsonify({"error": "No valid model selected."}), 400
 
+    try:
+        input_img = process_input_strokes(strokes)
+        return jsonify(transform_input(input_img, model_name, sid))
 
-# WebSocket Events for real-time drawing collaboration
-connected_clients = set()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def prepare_input(data):
+    """Preprocesses the drawing of a request, given as stroke polylines ('strokes') or as canvas image ('imageData'),
+    at the requested output resolution ('resolution': 256 by default, 512, 1024 or "native")."""
+    size, native = parse_resolution(data.get('resolution'))
+    if data.get('strokes') is not None:
+        return process_input_strokes(data['strokes'], size, native)
+    image_data = data.get('imageData') or ""
+    try:
+        image_bytes = io.BytesIO(base64.b64decode(image_data.split(",")[-1]))
+        pixels = canvas_pixels(Image.open(image_bytes))
+    except (ValueError, OSError):
+        raise ValueError("The image could not be read.")
+    return Image.fromarray(preprocess_canvas(pixels, size, native))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues a drawing for transformation and returns its job ID at once; the result follows via /jobs/<job_id> or the 'job_done' event."""
+    data = request.get_json()
+    model_name, sid = data.get('model_selction'), data.get('sid')
+
+    if not model_name:
+        return jsonify({"error": "No valid model selected."}), 400
+
+    try:
+        input_img = prepare_input(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    notify = (lambda status: socketio.emit('job_done', status, to=sid)) if sid else None
+    try:
+        job_id, position = jobs.submit(lambda job_id: transform_input(input_img, model_name, sid, job_id), notify)
+    except QueueFullError:
+        return jsonify({"error": "The server is busy, please try again in a moment."}), 429, {"Retry-After": "1"}
+    return jsonify({"job_id": job_id, "status": "queued", "position": position, "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Returns the status of a job, with the result URLs once it is done."""
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(status)
+
+@app.route('/job_stats', methods=['GET'])
+def job_stats():
+    """Returns the number of queued and running jobs as JSON."""
+    return jsonify(jobs.stats())
+
+@app.route('/startup_timing', methods=['GET'])
+def startup_timing():
+    """Returns the seconds from the start of app.py to each startup phase, including the first response."""
+    return jsonify(timer.report())
+
+@app.after_request
+def mark_first_response(response):
+    if "first response" not in timer.phases:
+        timer.mark("first response")
+    return response
+
+@app.route('/room_stats', methods=['GET'])
+def room_stats():
+    """Returns the number of connected clients per drawing room as JSON."""
+    return jsonify(rooms.stats())
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Returns hit/miss counters of the result cache as JSON."""
+    return jsonify(cache.stats())
+
+@app.route('/get_result/<result_id>/<kind>')
+def get_result(result_id, kind):
+    """Serves the input or output image of a result from memory, or from the archive once it has expired there."""
+    image_bytes = results.get(result_id, kind)
+    if image_bytes is None:
+        image_bytes = archive.get(result_id, kind)
+    if image_bytes is None:
+        return jsonify({"error": "Image not found."}), 404
+    return send_file(io.BytesIO(image_bytes), mimetype='image/png')
+
+
+# WebSocket Events for real-time drawing collaboration, delivered only within a drawing room
+def enter_room(room):
+    """Moves the current client into a room and sends it the drawing of the room so far."""
+    previous = rooms.room_of(request.sid)
+    if previous is not None:
+        strokes.remove(request.sid)
+        leave_room(previous)
+        leave_room(legacy_room(previous))
+    canvas = rooms.join(request.sid, room)
+    join_room(room)
+    if request.args.get('strokes') != 'segments':  # clients without 'draw_segments' support get every point as event
+        join_room(legacy_room(room))
+        strokes.add_legacy_client(room, request.sid)
+    emit('canvas_state', dict(canvas.state(), room=room))  # snapshot plus the strokes since then
 
 @socketio.on('connect')
 def handle_connect():
-    connected_clients.add(request.sid)
+    enter_room(room_name(request.args.get('room')))
     print(f"Client connected: {request.sid}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    connected_clients.discard(request.sid)
+    rooms.leave(request.sid)
+    strokes.remove(request.sid)
     print(f"Client disconnected: {request.sid}")
 
+@socketio.on('join_room')
+def handle_join_room(data):
+    enter_room(room_name((data or {}).get('room')))
+
+@socketio.on('leave_room')
+def handle_leave_room():
+    enter_room(default_room)
+
 @socketio.on('start_new_path')
 def handle_start_new_path(data):
-    emit('new_path', data, broadcast=True, include_self=False)
+    point, room = read_point(data), rooms.room_of(request.sid)
+    if point and room:
+        strokes.start_path(room, request.sid, *point)
 
 @socketio.on('draw_data')
 def handle_draw_data(data):
-    emit('update_canvas', data, broadcast=True, include_self=False)
+    point, room = read_point(data), rooms.room_of(request.sid)
+    if point and room:
+        strokes.add_point(room, request.sid, *point)
 
 @socketio.on('reset_canvas')
 def handle_reset_canvas():
-    emit('clear_canvas', broadcast=True, include_self=False)
+    room = rooms.room_of(request.sid)
+    canvas = rooms.canvas(room)
+    if canvas is None:
+        return
+    # Strokes drawn before the reset must not arrive after it, and no stroke may slip in between
+    strokes.flush(after=lambda: emit('clear_canvas', {"seq": canvas.clear(), "room": room}, to=room, include_self=False))
 
 
 
@@ -0,0 +1,536 @@
+"""
+Benchmarks for the Sketch2RealImage tools
+
+This script measures the performance-critical parts of the project and checks that optimized code paths
+produce the same results as the original ones.
+
+## Usage:
+Run the script from the command line with the name of a benchmark:
+
+    python benchmark.py <benchmark> [options]
+
+### Benchmarks:
+- `rasterize`: Images per second of the PIL drawing chain (`drawing_to_image`, `convert_to_black_and_white`,
+  `enhance_contrast`) against the NumPy rasterizer `drawings_to_arrays` of `prepare_ndjson.py`.
+  Options: `--ndjson <file>` (QuickDraw drawings, otherwise random strokes), `--count`, `--batch_size`, `--seed`.
+- `binarize`: Time and peak memory of `CycleGANModel.convert_to_black_white` (new, new in place via `out`) against
+  the original clone-and-scatter implementation for batch sizes 1-32 on the CPU.
+  Options: `--batch_sizes`, `--repeats`, `--size`. Needs the CycleGAN submodule.
+- `preprocess`: Sketches per second of the web input preprocessing (`ensure_white_background`, `process_input_image`,
+  `image_to_tensor`) against the single-pass `preprocess_canvas` of `interaction/preprocessing.py` on 1500x700 canvases.
+  Options: `--count`, `--width`, `--height`, `--seed`.
+- `variants`: Latency (batch 1) of the CPU variants of a generator (see `export_cpu_models.py`) and the pixel
+  difference of their output to the fp32 output on held-out sketches.
+  Options: `--model`, `--variants`, `--dataroot <folder>` (test sketches, otherwise random strokes), `--count`, `--repeats`.
+- `tiled`: Latency and peak memory of the high-resolution output (`interaction/tiling.py`) at 256-1024 pixels and
+  the size of the canvas, against one forward pass over the whole image, and the pixel difference between both.
+  Options: `--model`, `--sizes`, `--batch_size` (tiles per forward pass), `--repeats`, `--seed`.
+- `dataload`: Training batches per second of the per-image pipeline of the unaligned dataset (decode, resize, crop,
+  flip, normalize) against `cached_unaligned_dataset.py` (decoded once, batched crop and flip), and its decode time.
+  Options: `--dataroot <folder>` (with `<phase>A` and `<phase>B`, otherwise random images), `--count`, `--batch_size`,
+  `--batches`, `--load_size`, `--crop_size`, `--cache_budget` (MB, 0 to test the memory-mapped store).
+- `amp`: Time and peak memory of a CycleGAN training step (`optimize_parameters`) in float32 against
+  `--mixed_precision bf16` (and `fp16`) on the same data and weights, and the difference of the first losses.
+  Options: `--precisions`, `--batch_size`, `--size`, `--ngf`, `--steps`, `--seed`. Needs the CycleGAN submodule.
+- `noise`: Sketches per second of the original `add_salt_and_pepper_noise` (one noise pattern for the whole batch)
+  against the per-sample version of `cycle_gan_model.py` and `SketchNoise` of `sketch_noise.py` with jitter and dropout.
+  Options: `--batch_sizes`, `--prob`, `--repeats`, `--size`. Needs the CycleGAN submodule.
+- `pool`: Time, allocations and memory of a query of the image pool `ImagePool` of the CycleGAN repository against
+  `TensorImagePool` of `cycle_gan_model.py` in float32, float16 and uint8, with a filled pool.
+  Options: `--pool_size`, `--batch_sizes`, `--size`, `--repeats`. Needs the CycleGAN submodule.
+
+### Example:
+    python benchmark.py rasterize --ndjson Orginal_CycleGAN_Repository/datasets/car/car.ndjson --count 4000
+    python benchmark.py binarize --batch_sizes 1 8 32
+    python benchmark.py preprocess --count 200
+    python benchmark.py variants --model car --dataroot Orginal_CycleGAN_Repository/datasets/car/testA
+    python benchmark.py tiled --model car --sizes 512 1024 native
+    python benchmark.py dataload --dataroot Orginal_CycleGAN_Repository/datasets/car
+    python benchmark.py amp --precisions bf16 --steps 5
+    python benchmark.py noise --batch_sizes 1 8 32
+    python benchmark.py pool --batch_sizes 1 4
+"""
+
+import argparse
+import importlib.util
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from sketch_samples import random_drawings
+
+
+def load_cycle_gan_model():
+    """Imports `cycle_gan_model.py` of this repository as part of the `models` package of the CycleGAN submodule."""
+    repo_dir = os.path.abspath("Orginal_CycleGAN_Repository")
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)
+    spec = importlib.util.spec_from_file_location("models.sketch_cycle_gan_model", "cycle_gan_model.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def training_options(**options):
+    """Returns the options of a CycleGAN training run on the CPU (defaults of the repository), updated by `options`."""
+    import tempfile
+    from types import SimpleNamespace
+
+    defaults = dict(isTrain=True, gpu_ids=[], checkpoints_dir=tempfile.gettempdir(), name="benchmark", preprocess="resize_and_crop",
+                    input_nc=3, output_nc=3, ngf=64, ndf=64, netG="resnet_9blocks", netD="basic", n_layers_D=3, norm="instance",
+                    no_dropout=True, init_type="normal", init_gain=0.02, pool_size=50, gan_mode="lsgan", lr=0.0002, beta1=0.5,
+                    lambda_A=10.0, lambda_B=10.0, lambda_identity=0.5, direction="AtoB", print_freq=100, mixed_precision="none")
+    return SimpleNamespace(**dict(defaults, **options))
+
+
+def time_call(fn, repeats):
+    """Returns the median wall time (seconds) of `repeats` calls after one warm-up call."""
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def peak_cpu_memory(fn):
+    """Returns the peak of the CPU memory allocated by torch during one call (bytes), from the profiler's memory events."""
+    from torch.profiler import profile, ProfilerActivity
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    current = peak = 0
+    for event in sorted(prof.events(), key=lambda event: event.time_range.start):
+        current += event.self_cpu_memory_usage
+        peak = max(peak, current)
+    return peak
+
+
+def allocations(fn):
+    """Returns the number and total size (bytes) of the CPU memory allocations of torch during one call."""
+    from torch.profiler import profile, ProfilerActivity
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    sizes = [event.self_cpu_memory_usage for event in prof.events() if event.self_cpu_memory_usage > 0]
+    return len(sizes), sum(sizes)
+
+
+def convert_to_black_white_reference(tensor, threshold):
+    """The original implementation of `CycleGANModel.convert_to_black_white` (clone and two masked assignments)."""
+    mask = (tensor < threshold).all(dim=1, keepdim=True)
+    tensor = tensor.clone()
+    tensor[mask.expand_as(tensor)] = -1
+    tensor[~mask.expand_as(tensor)] = 1
+    return tensor
+
+
+def add_salt_and_pepper_noise_reference(image_tensor, prob):
+    """The original implementation of `CycleGANModel.add_salt_and_pepper_noise` (random coordinates shared by the batch)."""
+    import torch
+
+    noisy_image = image_tensor.clone()
+    _, _, height, width = noisy_image.shape
+    num_noise = int(prob * height * width / 2)
+    salt_coords = (torch.randint(0, height, (num_noise,)), torch.randint(0, width, (num_noise,)))
+    noisy_image[:, :, salt_coords[0], salt_coords[1]] = 1.0
+    pepper_coords = (torch.randint(0, height, (num_noise,)), torch.randint(0, width, (num_noise,)))
+    noisy_image[:, :, pepper_coords[0], pepper_coords[1]] = -1.0
+    return noisy_image
+
+
+def benchmark_rasterize(args):
+    """Compares images/second and output of the PIL chain and the NumPy rasterizer."""
+    from prepare_ndjson import (drawing_to_image, convert_to_black_and_white, enhance_contrast,
+                                drawings_to_arrays, iter_drawing_data)
+
+    if args.ndjson:
+        drawings = list(itertools.islice(iter_drawing_data([args.ndjson]), args.count))
+    else:
+        drawings = random_drawings(args.count, args.seed)
+
+    start = time.perf_counter()
+    reference = [np.asarray(enhance_contrast(convert_to_black_and_white(drawing_to_image(drawing))))
+                 for drawing in drawings]
+    pil_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    arrays = [drawings_to_arrays(drawings[i:i + args.batch_size]) for i in range(0, len(drawings), args.batch_size)]
+    numpy_time = time.perf_counter() - start
+
+    identical = np.array_equal(np.stack(reference), np.concatenate(arrays))
+    print(f"Drawings:          {len(drawings)}")
+    print(f"PIL chain:         {len(drawings) / pil_time:8.1f} images/s")
+    print(f"NumPy (batch {args.batch_size:>3}): {len(drawings) / numpy_time:8.1f} images/s")
+    print(f"Speedup:           {pil_time / numpy_time:8.2f}x")
+    print(f"Identical output:  {identical}")
+
+
+def benchmark_binarize(args):
+    """Compares time, peak memory and output of the original and the fused binarization."""
+    import torch
+
+    convert = load_cycle_gan_model().CycleGANModel.convert_to_black_white
+    torch.manual_seed(0)
+    print(f"{'batch':>5} | {'original ms':>11} {'MB':>6} | {'fused ms':>8} {'MB':>6} | {'in place ms':>11} {'MB':>6} | identical")
+    for batch_size in args.batch_sizes:
+        # Values around the threshold, like generator outputs
+        tensor = torch.rand(batch_size, 3, args.size, args.size) * 2 - 1
+        scratch = tensor.clone()
+        variants = [
+            lambda: convert_to_black_white_reference(tensor, 0.03),
+            lambda: convert(None, tensor, 0.03),
+            lambda: convert(None, scratch.copy_(tensor), 0.03, out=scratch),
+        ]
+        results = [(time_call(fn, args.repeats) * 1000, peak_cpu_memory(fn) / 2**20) for fn in variants]
+        identical = torch.equal(variants[0](), variants[1]()) and torch.equal(variants[0](), variants[2]())
+        print(f"{batch_size:>5} | " + " | ".join(f"{ms:>{w}.2f} {mb:>6.1f}" for (ms, mb), w in zip(results, (11, 8, 11)))
+              + f" | {identical}")
+    print("The in place variant includes copying the input into the reused tensor.")
+
+
+def random_canvases(count, width, height, seed=0):
+    """Creates decoded browser canvases (white RGBA) with black strokes, from a few pixels up to the whole canvas."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    canvases = []
+    for i in range(count):
+        image = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        extent = (10, 100, 300, max(width, height))[i % 4]
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        for _ in range(rng.randint(1, 8)):
+            points = [(x + rng.uniform(-extent, extent) / 2, y + rng.uniform(-extent, extent) / 2)
+                      for _ in range(rng.randint(2, 20))]
+            draw.line(points, fill=(0, 0, 0, 255), width=rng.randint(1, 5))
+        canvases.append(image)
+    return canvases
+
+
+def benchmark_preprocess(args):
+    """Compares sketches/second and model input of the PIL preprocessing chain and the single-pass NumPy pipeline."""
+    from interaction.helpers import ensure_white_background, process_input_image
+    from interaction.inference import image_to_tensor
+    from interaction.preprocessing import canvas_pixels, preprocess_canvas, normalize_sketch
+
+    canvases = random_canvases(args.count, args.width, args.height, args.seed)
+
+    start = time.perf_counter()
+    reference = [image_to_tensor(process_input_image(ensure_white_background(image)))[0].numpy() for image in canvases]
+    pil_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    inputs = [normalize_sketch(preprocess_canvas(canvas_pixels(image))) for image in canvases]
+    numpy_time = time.perf_counter() - start
+
+    identical = all(np.array_equal(a, b) for a, b in zip(reference, inputs))
+    print(f"Canvases:          {len(canvases)} ({args.width}x{args.height})")
+    print(f"PIL chain:         {len(canvases) / pil_time:8.1f} sketches/s")
+    print(f"Single pass:       {len(canvases) / numpy_time:8.1f} sketches/s")
+    print(f"Speedup:           {pil_time / numpy_time:8.2f}x")
+    print(f"Identical output:  {identical}")
+
+
+def benchmark_variants(args):
+    """Compares latency and output of the CPU variants of a generator with the fp32 generator."""
+    import torch
+    from evaluate import tensor_to_arrays
+    from sketch_samples import load_sketches
+    from interaction.registry import ModelRegistry
+
+    # Held out: export_cpu_models.py calibrates on random strokes with seed 0 or on the training sketches
+    sketches = load_sketches(args.dataroot, args.count, seed=args.seed)
+    reference = reference_ms = None
+    print(f"{'variant':>13} | {'ms/image':>8} | {'speedup':>7} | {'mean |diff|':>11} | {'max |diff|':>10} | {'PSNR dB':>7}")
+    for variant in ["fp32"] + [variant for variant in args.variants if variant != "fp32"]:
+        registry = ModelRegistry(os.path.abspath(args.model_dir), device="cpu", variants=variant)
+        if registry.model_variant(args.model) != variant:
+            print(f"{variant:>13} | not exported (python export_cpu_models.py --variants {variant})")
+            continue
+        net = registry.get(args.model)
+        with torch.inference_mode():
+            ms = time_call(lambda: net(sketches[:1]), args.repeats) * 1000
+            outputs = tensor_to_arrays(torch.cat([net(sketches[i:i + 1]) for i in range(len(sketches))])).astype(np.int16)
+        if reference is None:
+            reference, reference_ms = outputs, ms
+        diff = np.abs(outputs - reference)
+        mse = np.mean(diff.astype(np.float64) ** 2)
+        psnr = 10 * np.log10(255 ** 2 / mse) if mse else float("inf")
+        print(f"{variant:>13} | {ms:>8.1f} | {reference_ms / ms:>6.2f}x | {diff.mean():>11.2f} | {diff.max():>10d} | {psnr:>7.1f}")
+    print(f"Differences in 8-bit pixel values over {len(sketches)} sketches.")
+
+
+def benchmark_tiled(args):
+    """Compares tiled generation at growing output sizes with one forward pass over the whole image."""
+    import torch
+    from interaction.helpers import canvas_width, canvas_height, process_input_strokes, max_output_size
+    from interaction.inference import InferenceEngine, image_to_tensor
+    from interaction.registry import ModelRegistry
+    from interaction.tiling import generate_tiled
+
+    engine = InferenceEngine(ModelRegistry(os.path.abspath(args.model_dir), device="cpu", variants="fp32"))
+    # A random drawing spread over the whole canvas
+    drawing = [[[x * canvas_width / 255 for x in xs], [y * canvas_height / 255 for y in ys]]
+               for xs, ys in random_drawings(1, args.seed)[0]]
+    print(f"{'size':>10} | {'tiles':>5} | {'whole ms':>8} | {'whole MB':>8} | {'tiled ms':>8} | {'tiled MB':>8} | {'mean |diff|':>11}")
+    for size in args.sizes:
+        native = size == "native"
+        image = process_input_strokes(drawing, max_output_size if native else int(size), native)
+        tensor = image_to_tensor(image)
+        tiles = []
+        whole = lambda: engine.run(args.model, tensor)[0, :, :tensor.shape[2], :tensor.shape[3]]  # sizes not divisible by 4 grow
+        tiled = lambda: generate_tiled(tensor, lambda batch: tiles.append(len(batch)) or engine.run_tiles(args.model, batch, args.batch_size))
+        with torch.inference_mode():
+            results = []
+            for fn in (whole, tiled):
+                ms = time_call(fn, args.repeats) * 1000
+                results += [ms, peak_cpu_memory(fn) / 2**20]
+            diff = (whole() - tiled()).abs().mean().item() * 127.5
+        print(f"{'x'.join(map(str, image.size)):>10} | {tiles[0]:>5} | {results[0]:>8.0f} | {results[1]:>8.0f} | "
+              f"{results[2]:>8.0f} | {results[3]:>8.0f} | {diff:>11.2f}")
+    print("Peak memory allocated by torch; differences in 8-bit pixel values.")
+
+
+def write_random_dataset(folder, phase, count, seed=0):
+    """Writes `count` random sketches (PNG) to `<phase>A` and random color images (JPEG) to `<phase>B`, all 256x256."""
+    from PIL import Image
+    from prepare_ndjson import drawings_to_arrays
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(folder, phase + "A"))
+    os.makedirs(os.path.join(folder, phase + "B"))
+    for i, sketch in enumerate(drawings_to_arrays(random_drawings(count, seed))):
+        Image.fromarray(sketch).save(os.path.join(folder, phase + "A", f"{i}.png"))
+        coarse = rng.integers(0, 256, (16, 16, 3), dtype=np.uint8)
+        Image.fromarray(coarse).resize((256, 256), Image.BICUBIC).save(os.path.join(folder, phase + "B", f"{i}.jpg"))
+
+
+def load_reference(path, load_size, crop_size):
+    """Loads one training image like the unaligned dataset with `get_transform` (resize_and_crop, flip)."""
+    from PIL import Image
+
+    image = Image.open(path).convert("RGB").resize((load_size, load_size), Image.BICUBIC)
+    left, top = random.randint(0, load_size - crop_size), random.randint(0, load_size - crop_size)
+    image = image.crop((left, top, left + crop_size, top + crop_size))
+    if random.random() < 0.5:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    array = np.asarray(image, dtype=np.float32) / 127.5 - 1.0
+    return array.transpose(2, 0, 1)
+
+
+def benchmark_dataload(args):
+    """Compares training batches/second of per-image decoding and of the cached dataset with batched augmentation."""
+    import tempfile
+    from types import SimpleNamespace
+    import torch
+    from cached_unaligned_dataset import CachedUnalignedDataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataroot = args.dataroot
+        if dataroot is None:
+            dataroot = tmp
+            write_random_dataset(dataroot, args.phase, args.count)
+        opt = SimpleNamespace(dataroot=dataroot, phase=args.phase, direction="AtoB", input_nc=3, output_nc=3,
+                              preprocess="resize_and_crop", load_size=args.load_size, crop_size=args.crop_size,
+                              no_flip=False, serial_batches=False, max_dataset_size=float("inf"),
+                              cache_budget=args.cache_budget, cache_dir=tmp, cache_threads=None,
+                              noise_salt_pepper=0.0, noise_jitter=0, noise_dropout=0.0, noise_seed=None)
+        dataset = CachedUnalignedDataset(opt)
+        batches = [random.sample(range(len(dataset)), min(args.batch_size, len(dataset))) for _ in range(args.batches)]
+        paths_A, paths_B = dataset.stores["A"].paths, dataset.stores["B"].paths
+
+        def per_image():
+            for indices in batches:
+                torch.from_numpy(np.stack([load_reference(paths_A[i % len(paths_A)], args.load_size, args.crop_size) for i in indices]))
+                torch.from_numpy(np.stack([load_reference(random.choice(paths_B), args.load_size, args.crop_size) for _ in indices]))
+
+        def cached():
+            for indices in batches:
+                items = dataset.__getitems__(indices)
+                torch.stack([item["A"] for item in items]), torch.stack([item["B"] for item in items])
+
+        per_image_time, cached_time = time_call(per_image, 1), time_call(cached, 1)
+        decode_time = sum(store.decode_time for store in dataset.stores.values())
+        print(f"Per-image pipeline: {args.batches / per_image_time:8.1f} batches/s ({1000 * per_image_time / args.batches:.1f} ms per batch)")
+        print(f"Cached dataset:     {args.batches / cached_time:8.1f} batches/s ({1000 * cached_time / args.batches:.1f} ms per batch)")
+        print(f"Speedup:            {per_image_time / cached_time:8.2f}x")
+        print(f"One-time decoding:  {decode_time:8.2f} s for {len(paths_A) + len(paths_B)} images")
+
+
+def benchmark_amp(args):
+    """Compares step time, peak memory and losses of float32 and mixed precision CycleGAN training steps."""
+    import torch
+    from prepare_ndjson import drawings_to_arrays
+
+    CycleGANModel = load_cycle_gan_model().CycleGANModel
+    sketches = drawings_to_arrays(random_drawings(args.batch_size, args.seed), (args.size, args.size)).astype(np.float32) / 127.5 - 1
+    generator = torch.Generator().manual_seed(args.seed)
+    data = {"A": torch.from_numpy(sketches).unsqueeze(1).expand(-1, 3, -1, -1).contiguous(),
+            "B": torch.rand(args.batch_size, 3, args.size, args.size, generator=generator) * 2 - 1,
+            "A_paths": [""] * args.batch_size, "B_paths": [""] * args.batch_size}
+
+    reference = None
+    print(f"{'precision':>9} | {'ms/step':>8} | {'speedup':>7} | {'peak MB':>7} | {'loss_G':>8} | {'|diff|':>8}")
+    for precision in ["none"] + [precision for precision in args.precisions if precision != "none"]:
+        torch.manual_seed(args.seed)  # same initial weights for every precision
+        model = CycleGANModel(training_options(ngf=args.ngf, ndf=args.ngf, mixed_precision=precision))
+
+        def step():
+            model.set_input({key: value.clone() if torch.is_tensor(value) else value for key, value in data.items()})
+            model.optimize_parameters()
+
+        step()
+        loss_G = model.loss_G.item()  # first step: same weights and data
+        ms = time_call(step, args.steps) * 1000
+        mb = peak_cpu_memory(step) / 2**20
+        if reference is None:
+            reference = (ms, mb, loss_G)
+        print(f"{precision:>9} | {ms:>8.0f} | {reference[0] / ms:>6.2f}x | {mb:>7.0f} | {loss_G:>8.4f} | {abs(loss_G - reference[2]):>8.4f}")
+    print("Peak memory allocated by torch during one step; loss_G of the first step.")
+
+
+def benchmark_noise(args):
+    """Compares sketches/second and noise statistics of the original and the per-sample noise implementations."""
+    import torch
+    from sketch_noise import SketchNoise
+
+    add_noise = load_cycle_gan_model().CycleGANModel.add_salt_and_pepper_noise
+    torch.manual_seed(0)
+    variants = [("original", lambda x: add_salt_and_pepper_noise_reference(x, args.prob)),
+                ("per sample", lambda x: add_noise(None, x, args.prob)),
+                ("SketchNoise", SketchNoise(salt_pepper=args.prob, seed=0)),
+                ("+jitter+drop", SketchNoise(salt_pepper=args.prob, jitter=4, dropout=0.1, seed=0))]
+    print(f"{'batch':>5} | " + " | ".join(f"{name:>12}" for name, _ in variants) + "   (sketches/s)")
+    for batch_size in args.batch_sizes:
+        sketches = torch.ones(batch_size, 3, args.size, args.size)
+        rates = [batch_size / time_call(lambda: fn(sketches), args.repeats) for _, fn in variants]
+        print(f"{batch_size:>5} | " + " | ".join(f"{rate:>12.0f}" for rate in rates))
+
+    sketches = torch.ones(8, 3, args.size, args.size)
+    for name, fn in variants[:2]:
+        noisy = fn(sketches)
+        black = noisy[:, 0] == -1
+        shared = (black[0] & black[1:]).sum().item() / black[0].sum().item() / (len(black) - 1)
+        print(f"{name}: {black.float().mean().item():.3f} black pixels (expected {args.prob / 2:.3f}), "
+              f"{shared:.1%} of them also black in the other samples")
+
+
+def benchmark_pool(args):
+    """Compares query time, allocations and memory of the list-based and the preallocated image pool."""
+    import random
+    import torch
+
+    TensorImagePool = load_cycle_gan_model().TensorImagePool
+    from util.image_pool import ImagePool
+
+    variants = [("ImagePool", lambda: ImagePool(args.pool_size))]
+    variants += [(f"Tensor {dtype}", lambda dtype=dtype: TensorImagePool(args.pool_size, getattr(torch, dtype)))
+                 for dtype in ("float32", "float16", "uint8")]
+    print(f"pool size {args.pool_size}, images 3x{args.size}x{args.size}")
+    print(f"{'batch':>5} | {'variant':<16} | {'query ms':>8} | {'allocs':>6} | {'alloc MB':>8} | {'pool MB':>7}")
+    for batch_size in args.batch_sizes:
+        images = torch.rand(batch_size, 3, args.size, args.size) * 2 - 1
+        for name, make_pool in variants:
+            random.seed(0)
+            pool = make_pool()
+            while pool.num_imgs < args.pool_size:  # measure the queries of a full pool, which swap images
+                pool.query(images.clone())  # a new batch like the generator outputs of every iteration
+            if isinstance(pool.images, torch.Tensor):
+                stored = pool.images.nbytes
+            else:  # ImagePool keeps views of the queried batches, which keep the whole batches alive
+                storages = {image.untyped_storage().data_ptr(): image.untyped_storage().nbytes() for image in pool.images}
+                stored = sum(storages.values())
+            seconds = time_call(lambda: pool.query(images), args.repeats)
+            count, size = allocations(lambda: [pool.query(images) for _ in range(args.repeats)])
+            print(f"{batch_size:>5} | {name:<16} | {1000 * seconds:>8.3f} | {count / args.repeats:>6.2f} | "
+                  f"{size / args.repeats / 2**20:>8.2f} | {stored / 2**20:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the Sketch2RealImage tools.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    rasterize = subparsers.add_parser("rasterize", help="PIL drawing chain vs. NumPy rasterizer of prepare_ndjson.py")
+    rasterize.add_argument("--ndjson", type=str, default=None, help="QuickDraw .ndjson file (default: random drawings)")
+    rasterize.add_argument("--count", type=int, default=2000, help="Number of drawings")
+    rasterize.add_argument("--batch_size", type=int, default=64, help="Drawings per call of drawings_to_arrays")
+    rasterize.add_argument("--seed", type=int, default=0, help="Seed for the random drawings")
+    rasterize.set_defaults(func=benchmark_rasterize)
+
+    binarize = subparsers.add_parser("binarize", help="Original vs. fused CycleGANModel.convert_to_black_white")
+    binarize.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Batch sizes to measure")
+    binarize.add_argument("--repeats", type=int, default=20, help="Timed calls per variant and batch size")
+    binarize.add_argument("--size", type=int, default=256, help="Image height and width")
+    binarize.set_defaults(func=benchmark_binarize)
+
+    preprocess = subparsers.add_parser("preprocess", help="PIL preprocessing chain vs. single-pass preprocess_canvas")
+    preprocess.add_argument("--count", type=int, default=100, help="Number of canvases")
+    preprocess.add_argument("--width", type=int, default=1500, help="Canvas width")
+    preprocess.add_argument("--height", type=int, default=700, help="Canvas height")
+    preprocess.add_argument("--seed", type=int, default=0, help="Seed for the random strokes")
+    preprocess.set_defaults(func=benchmark_preprocess)
+
+    variants = subparsers.add_parser("variants", help="Latency and fidelity of the CPU variants of a generator")
+    variants.add_argument("--model", type=str, required=True, help="Model name (e.g. car for car_net_G.pth)")
+    variants.add_argument("--variants", type=str, nargs="+", default=["channels_last", "traced", "int8"],
+                          help="Variants to compare with fp32 (channels_last, compiled, traced, int8)")
+    variants.add_argument("--model_dir", type=str, default=os.path.join("interaction", "models"), help="Folder of the checkpoints")
+    variants.add_argument("--dataroot", type=str, default=None, help="Folder of held-out sketches (default: random strokes)")
+    variants.add_argument("--count", type=int, default=16, help="Number of sketches")
+    variants.add_argument("--repeats", type=int, default=5, help="Timed calls per variant")
+    variants.add_argument("--seed", type=int, default=1, help="Seed for the random strokes")
+    variants.set_defaults(func=benchmark_variants)
+
+    tiled = subparsers.add_parser("tiled", help="Tiled high-resolution generation vs. one forward pass")
+    tiled.add_argument("--model", type=str, required=True, help="Model name (e.g. car for car_net_G.pth)")
+    tiled.add_argument("--model_dir", type=str, default=os.path.join("interaction", "models"), help="Folder of the checkpoints")
+    tiled.add_argument("--sizes", type=str, nargs="+", default=["256", "512", "1024", "native"], help="Output sizes (or native)")
+    tiled.add_argument("--batch_size", type=int, default=4, help="Tiles per forward pass")
+    tiled.add_argument("--repeats", type=int, default=3, help="Timed calls per size")
+    tiled.add_argument("--seed", type=int, default=0, help="Seed for the random drawing")
+    tiled.set_defaults(func=benchmark_tiled)
+
+    dataload = subparsers.add_parser("dataload", help="Per-image training data pipeline vs. cached_unaligned_dataset.py")
+    dataload.add_argument("--dataroot", type=str, default=None, help="Dataset folder (default: random images)")
+    dataload.add_argument("--phase", type=str, default="train", help="Reads <phase>A and <phase>B")
+    dataload.add_argument("--count", type=int, default=200, help="Number of random images per domain")
+    dataload.add_argument("--batch_size", type=int, default=4, help="Images per batch")
+    dataload.add_argument("--batches", type=int, default=50, help="Batches per pipeline")
+    dataload.add_argument("--load_size", type=int, default=286, help="Size the images are resized to")
+    dataload.add_argument("--crop_size", type=int, default=256, help="Size of the random crops")
+    dataload.add_argument("--cache_budget", type=float, default=2048, help="RAM (MB) of the cache, 0 to memory-map it")
+    dataload.set_defaults(func=benchmark_dataload)
+
+    amp = subparsers.add_parser("amp", help="float32 vs. mixed precision CycleGAN training steps")
+    amp.add_argument("--precisions", type=str, nargs="+", default=["bf16"], choices=["none", "bf16", "fp16"],
+                     help="Mixed precision modes to compare with float32")
+    amp.add_argument("--batch_size", type=int, default=1, help="Images per domain and step")
+    amp.add_argument("--size", type=int, default=256, help="Image height and width")
+    amp.add_argument("--ngf", type=int, default=64, help="Filters of the generators and discriminators")
+    amp.add_argument("--steps", type=int, default=3, help="Timed training steps per precision")
+    amp.add_argument("--seed", type=int, default=0, help="Seed for data and weights")
+    amp.set_defaults(func=benchmark_amp)
+
+    noise = subparsers.add_parser("noise", help="Original vs. per-sample salt-and-pepper noise")
+    noise.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 8, 32], help="Batch sizes to measure")
+    noise.add_argument("--prob", type=float, default=0.05, help="Probability of a pixel to become noise")
+    noise.add_argument("--repeats", type=int, default=20, help="Timed calls per variant and batch size")
+    noise.add_argument("--size", type=int, default=256, help="Image height and width")
+    noise.set_defaults(func=benchmark_noise)
+
+    pool = subparsers.add_parser("pool", help="ImagePool vs. preallocated TensorImagePool")
+    pool.add_argument("--pool_size", type=int, default=50, help="Images in the pool (--pool_size of the training)")
+    pool.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4], help="Batch sizes to measure")
+    pool.add_argument("--size", type=int, default=256, help="Image height and width")
+    pool.add_argument("--repeats", type=int, default=200, help="Timed queries per variant and batch size")
+    pool.set_defaults(func=benchmark_pool)
+
+    args = parser.parse_args()
+    args.func(args)
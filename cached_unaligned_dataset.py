@@ -0,0 +1,236 @@
+"""
+Cached Unaligned Dataset
+
+The unaligned dataset of the CycleGAN repository opens, decodes and resizes every PNG/JPEG of `trainA` and
+`trainB` again in each epoch, and crops, flips and normalizes each image on its own with PIL and torchvision.
+On CPU training machines these data loader workers compete with the generators for the cores.
+
+This dataset decodes both folders once, in parallel threads, into a compact uint8 store per domain
+(`[N, H, W, C]` at `--load_size`, 245 KB for a 286x286 RGB image). The stores are kept in RAM as long as
+they fit into `--cache_budget`, otherwise they spill into a memory-mapped file, which the operating
+system pages in as needed. Both are shared by all data loader workers without copies. Random crop, flip
+and normalization then run for a whole batch at once: crops and flips are views into the store, which
+are gathered into the batch by one copy, followed by one conversion to float.
+
+## Usage:
+Copy this file into `Orginal_CycleGAN_Repository/data` and train with `--dataset_mode cached_unaligned`:
+
+    python train.py --dataroot ./datasets/car --name car_cyclegan --model cycle_gan --dataset_mode cached_unaligned
+
+### Parameters:
+- `--cache_budget`: (Optional) RAM in MB for the decoded images of both domains. Defaults to 2048. A domain that
+  does not fit anymore is written to `<phase>A.cache.npy` or `<phase>B.cache.npy` and memory-mapped.
+- `--cache_dir`: (Optional) Folder of the memory-mapped files. Defaults to `--dataroot`.
+- `--cache_threads`: (Optional) Threads that decode the images at the start. Defaults to the number of CPUs.
+- `--noise_salt_pepper`, `--noise_jitter`, `--noise_dropout`, `--noise_seed`: (Optional) Noise for the sketches (domain A)
+  in the data loader workers, see `sketch_noise.py` (copy it into `Orginal_CycleGAN_Repository/util`). Off by default.
+
+`--preprocess` supports `resize_and_crop` (the default), `resize`, `crop` and `none`; `crop` and `none` need
+images of one size. The model prints how long each iteration waited for its data, and
+`python benchmark.py dataload --dataroot <folder>` compares the loading speed with the per-image pipeline.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+try:
+    from data.base_dataset import BaseDataset
+    from data.image_folder import make_dataset
+except ImportError:  # used outside of the CycleGAN repository, e.g. by benchmark.py
+    make_dataset = None
+
+    class BaseDataset(torch.utils.data.Dataset):
+        """Stands in for the base dataset of the CycleGAN repository."""
+
+        def __init__(self, opt):
+            self.opt = opt
+            self.root = opt.dataroot
+
+
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".tif", ".tiff")
+PREPROCESS_MODES = ("resize_and_crop", "resize", "crop", "none")
+
+
+def list_images(folder, max_size=float("inf")):
+    """Returns the sorted image paths of a folder like `make_dataset` of the CycleGAN repository."""
+    if make_dataset is not None:
+        return sorted(make_dataset(folder, max_size))
+    paths = sorted(os.path.join(root, name) for root, _, names in sorted(os.walk(folder))
+                   for name in names if name.lower().endswith(IMG_EXTENSIONS))
+    return paths[:min(max_size, len(paths))]
+
+
+def decode_image(path, size=None, grayscale=False):
+    """Decodes an image to a uint8 array [H, W, C], resized to size (width, height) with BICUBIC like `get_transform`."""
+    image = Image.open(path).convert("L" if grayscale else "RGB")
+    if size is not None and image.size != tuple(size):
+        image = image.resize(tuple(size), Image.BICUBIC)
+    return np.asarray(image).reshape(image.size[1], image.size[0], -1)
+
+
+class ImageStore:
+    """The decoded images of one folder as one uint8 array [N, H, W, C], in RAM or memory-mapped from `spill_path`.
+
+    The images are decoded in `threads` threads (PIL releases the GIL while decoding and resizing). Without a
+    `size` all images must already have the size of the first one.
+    """
+
+    def __init__(self, paths, size=None, grayscale=False, budget=None, spill_path=None, threads=None):
+        if not paths:
+            raise ValueError("No images to cache.")
+        self.paths = paths
+        first = decode_image(paths[0], size, grayscale)
+        shape = (len(paths),) + first.shape
+        self.nbytes = int(np.prod(shape))
+        self.in_memory = budget is None or self.nbytes <= budget
+        if self.in_memory:
+            self.images = np.empty(shape, dtype=np.uint8)
+        else:
+            self.images = np.lib.format.open_memmap(spill_path, mode="w+", dtype=np.uint8, shape=shape)
+
+        start = time.perf_counter()
+
+        def fill(index):
+            image = decode_image(paths[index], size, grayscale)
+            if image.shape != first.shape:
+                raise ValueError(f"{paths[index]} has size {image.shape[1]}x{image.shape[0]}, expected "
+                                 f"{first.shape[1]}x{first.shape[0]}; use --preprocess resize_and_crop.")
+            self.images[index] = image
+
+        with ThreadPoolExecutor(threads or os.cpu_count()) as pool:
+            list(pool.map(fill, range(len(paths))))
+        if not self.in_memory:
+            self.images.flush()
+        self.decode_time = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.images)
+
+    def describe(self):
+        """Returns a one-line summary of the store for the training log."""
+        where = "in memory" if self.in_memory else f"memory-mapped from {self.images.filename}"
+        return (f"{len(self)} images of {self.images.shape[2]}x{self.images.shape[1]}x{self.images.shape[3]} "
+                f"({self.nbytes / 2**20:.0f} MB {where}, decoded in {self.decode_time:.1f} s)")
+
+
+def augment_batch(images, indices, crop_size=None, flip=False, generator=None):
+    """Randomly crops and flips the images `indices` of a uint8 store [N, H, W, C] and returns them as normalized tensor
+    [len(indices), C, crop, crop] in -1..1.
+
+    Crop offsets and flips are drawn per image, like `RandomCrop` and `RandomHorizontalFlip`. Both are views into
+    the store, so the batch is gathered by one copy into channel-first order and converted to float in one pass.
+    """
+    _, height, width, channels = images.shape
+    count = len(indices)
+    crop_height, crop_width = (height, width) if crop_size is None else (crop_size, crop_size)
+    tops = torch.randint(0, height - crop_height + 1, (count,), generator=generator).tolist()
+    lefts = torch.randint(0, width - crop_width + 1, (count,), generator=generator).tolist()
+    flips = (torch.rand(count, generator=generator) < 0.5).tolist() if flip else [False] * count
+    batch = np.empty((count, channels, crop_height, crop_width), dtype=np.uint8)
+    for i, (index, top, left, flipped) in enumerate(zip(indices, tops, lefts, flips)):
+        batch[i] = images[index].transpose(2, 0, 1)[:, top:top + crop_height, left:left + crop_width][:, :, ::-1 if flipped else 1]
+    return torch.from_numpy(batch).to(torch.float32).div_(127.5).sub_(1)  # same as ToTensor() followed by Normalize((0.5,)*3, (0.5,)*3)
+
+
+class CachedUnalignedDataset(BaseDataset):
+    """
+    Unaligned dataset ('<dataroot>/<phase>A' and '<dataroot>/<phase>B') that decodes both folders once into
+    uint8 image stores and crops, flips and normalizes whole batches with tensor operations.
+
+    The data loader fetches a batch with `__getitems__`; `__getitem__` returns a single data point like the
+    unaligned dataset.
+    """
+
+    @staticmethod
+    def modify_commandline_options(parser, is_train):
+        """Add new dataset-specific options, and rewrite default values for existing options.
+
+        Parameters:
+            parser          -- original option parser
+            is_train (bool) -- whether training phase or test phase. You can use this flag to add training-specific or test-specific options.
+
+        Returns:
+            the modified parser.
+        """
+        parser.add_argument('--cache_budget', type=float, default=2048, help='RAM (MB) for the decoded images; larger domains are memory-mapped')
+        parser.add_argument('--cache_dir', type=str, default=None, help='folder of the memory-mapped image files (default: dataroot)')
+        parser.add_argument('--cache_threads', type=int, default=None, help='threads that decode the images (default: number of CPUs)')
+        parser.add_argument('--noise_salt_pepper', type=float, default=0.0, help='probability of a sketch pixel to become white or black noise')
+        parser.add_argument('--noise_jitter', type=int, default=0, help='shift the sketches randomly by up to this many pixels')
+        parser.add_argument('--noise_dropout', type=float, default=0.0, help='probability of an 8x8 cell of a sketch to be erased')
+        parser.add_argument('--noise_seed', type=int, default=None, help='seed of the sketch noise, combined with the worker seeds of the data loader (default: random)')
+        return parser
+
+    def __init__(self, opt):
+        """Initialize this dataset class.
+
+        Parameters:
+            opt (Option class) -- stores all the experiment flags; needs to be a subclass of BaseOptions
+        """
+        BaseDataset.__init__(self, opt)
+        if opt.preprocess not in PREPROCESS_MODES:
+            raise ValueError(f"--dataset_mode cached_unaligned supports --preprocess {', '.join(PREPROCESS_MODES)}.")
+        self.dir_A = os.path.join(opt.dataroot, opt.phase + 'A')
+        self.dir_B = os.path.join(opt.dataroot, opt.phase + 'B')
+        btoA = self.opt.direction == 'BtoA'
+        input_nc = self.opt.output_nc if btoA else self.opt.input_nc
+        output_nc = self.opt.input_nc if btoA else self.opt.output_nc
+
+        size = (opt.load_size, opt.load_size) if opt.preprocess in ('resize_and_crop', 'resize') else None
+        self.crop_size = opt.crop_size if opt.preprocess in ('resize_and_crop', 'crop') else None
+        budget = opt.cache_budget * 2**20
+        cache_dir = opt.cache_dir or opt.dataroot
+        self.stores = {}
+        for domain, nc in (('A', input_nc), ('B', output_nc)):
+            paths = list_images(os.path.join(opt.dataroot, opt.phase + domain), opt.max_dataset_size)
+            store = ImageStore(paths, size, nc == 1, budget, os.path.join(cache_dir, f"{opt.phase}{domain}.cache.npy"),
+                               opt.cache_threads)
+            budget = max(0, budget - store.nbytes) if store.in_memory else budget
+            self.stores[domain] = store
+            print(f"cached {opt.phase}{domain}: {store.describe()}")
+        self.A_size = len(self.stores['A'])
+        self.B_size = len(self.stores['B'])
+
+        self.noise = None
+        if opt.noise_salt_pepper > 0 or opt.noise_jitter > 0 or opt.noise_dropout > 0:
+            try:
+                from util.sketch_noise import SketchNoise
+            except ImportError:  # outside of the CycleGAN repository
+                from sketch_noise import SketchNoise
+            self.noise = SketchNoise(opt.noise_salt_pepper, opt.noise_jitter, opt.noise_dropout, seed=opt.noise_seed)
+
+    def __getitems__(self, indices):
+        """Return the data points of a batch (see `__getitem__`), cropped and flipped together."""
+        indices = np.asarray(indices)
+        index_A = indices % self.A_size
+        if self.opt.serial_batches:   # make sure index is within then range
+            index_B = indices % self.B_size
+        else:   # randomize the index for domain B to avoid fixed pairs.
+            index_B = torch.randint(0, self.B_size, (len(indices),)).numpy()
+
+        flip = not self.opt.no_flip
+        A = augment_batch(self.stores['A'].images, index_A, self.crop_size, flip)
+        B = augment_batch(self.stores['B'].images, index_B, self.crop_size, flip)
+        if self.noise is not None:
+            A = self.noise(A)
+        return [{'A': a, 'B': b, 'A_paths': self.stores['A'].paths[i], 'B_paths': self.stores['B'].paths[j]}
+                for a, b, i, j in zip(A, B, index_A, index_B)]
+
+    def __getitem__(self, index):
+        """Return a data point and its metadata information.
+
+        Parameters:
+            index (int) -- a random integer for data indexing
+
+        Returns a dictionary that contains A, B, A_paths and B_paths
+        """
+        return self.__getitems__([index])[0]
+
+    def __len__(self):
+        """Return the total number of images in the dataset."""
+        return max(self.A_size, self.B_size)
@@ -1,10 +1,186 @@
+import json
+import os
+import random
+import time
 import torch
 import itertools
-from util.image_pool import ImagePool
+from collections import defaultdict
+from contextlib import contextmanager
 from .base_model import BaseModel
 from . import networks
 
 
+# Added for the sketch to real image project
+class PhaseProfiler:
+    """
+    Records wall time and peak memory of the phases of training steps (forward, backward, optimizer steps, ...).
+
+    Every `interval` steps the statistics per phase are appended as one JSON line to `path`. The peak memory is
+    the peak allocated by torch on CUDA devices and the peak resident memory of the process on the CPU (Linux),
+    both reset at the start of every phase. Steps in `trace_steps` are also written as torch profiler trace
+    (trace_step<n>.json next to `path`, for chrome://tracing or Perfetto) with the phases as labels.
+    With an interval of 0 and no trace steps, phases cost nothing but a context manager.
+    """
+
+    def __init__(self, path, interval=0, device=torch.device('cpu'), trace_steps=()):
+        self.path = path
+        self.interval = interval
+        self.device = device
+        self.trace_steps = set(trace_steps)
+        self.records = defaultdict(list)  # phase -> [(seconds, peak bytes or None), ...] since the last report
+        self.first_step = 1
+        self.trace = None
+
+    def start_step(self, step):
+        """Starts the torch profiler trace if `step` is one of the trace steps."""
+        if step in self.trace_steps:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.device.type == 'cuda':
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.trace = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+            self.trace.__enter__()
+
+    @contextmanager
+    def phase(self, name):
+        """Measures the code in the with block as phase `name`."""
+        if not self.interval and self.trace is None:
+            yield
+            return
+        self.reset_peak_memory()
+        start = time.perf_counter()
+        with torch.profiler.record_function(name):
+            yield
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+        self.add(name, time.perf_counter() - start, self.peak_memory())
+
+    def add(self, name, seconds, peak=None):
+        """Records a phase that was measured elsewhere (like the time waiting for data)."""
+        if self.interval:
+            self.records[name].append((seconds, peak))
+
+    def end_step(self, step):
+        """Writes the trace of a trace step and the statistics every `interval` steps."""
+        if self.trace is not None:
+            self.trace.__exit__(None, None, None)
+            self.trace.export_chrome_trace(os.path.join(os.path.dirname(self.path), 'trace_step%d.json' % step))
+            self.trace = None
+        if self.interval and step % self.interval == 0:
+            self.write(step)
+
+    def write(self, step):
+        """Appends the statistics of the steps since the last report to the profile file and starts over."""
+        total = sum(seconds for records in self.records.values() for seconds, _ in records)
+        phases = {}
+        for name, records in self.records.items():
+            times = [seconds for seconds, _ in records]
+            peaks = [peak for _, peak in records if peak is not None]
+            phases[name] = {'calls': len(times), 'mean_ms': round(1000 * sum(times) / len(times), 3),
+                            'max_ms': round(1000 * max(times), 3), 'total_ms': round(1000 * sum(times), 3),
+                            'share': round(sum(times) / total, 4) if total else 0.0,
+                            'peak_mb': round(max(peaks) / 2**20, 1) if peaks else None}
+        report = {'steps': [self.first_step, step], 'device': str(self.device),
+                  'memory': 'allocated' if self.device.type == 'cuda' else 'resident', 'phases': phases}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+        self.records.clear()
+        self.first_step = step + 1
+
+    def reset_peak_memory(self):
+        """Starts a new memory peak (on the CPU by resetting the peak resident memory of the process, Linux only)."""
+        if self.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(self.device)
+            return
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+
+    def peak_memory(self):
+        """Returns the memory peak (bytes) since the last reset, or None if it is not available."""
+        if self.device.type == 'cuda':
+            return torch.cuda.max_memory_allocated(self.device)
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+
+# Added for the sketch to real image project
+class TensorImagePool:
+    """
+    History of generated images like util.image_pool.ImagePool, stored in one preallocated tensor [pool_size, C, H, W].
+
+    The sampling is the same as ImagePool (including its use of the `random` module): the pool is filled with the
+    first `pool_size` images, which are returned as they are; afterwards every image is, with probability 0.5,
+    swapped with a random stored image, which is returned instead. A query copies the returned images into one
+    new batch and the new images into their slots of the pool, instead of keeping every generated batch alive
+    in a list and concatenating single images. With `dtype` float16 or uint8 (quantized from -1..1) the pool
+    needs a half or a quarter of the memory; the returned stored images are converted back to the dtype of the query.
+    """
+
+    def __init__(self, pool_size, dtype=torch.float32):
+        self.pool_size = pool_size
+        self.dtype = dtype
+        self.num_imgs = 0
+        self.images = None  # allocated on the first query, when the image size and device are known
+        self.scratch = None  # one float image for the quantization to uint8
+
+    def query(self, images):
+        """Returns images from the pool for the batch `images` [B, C, H, W] and stores the new images (see class docstring)."""
+        if self.pool_size == 0:
+            return images
+        images = images.detach()
+        if self.images is None:
+            self.images = torch.empty((self.pool_size,) + tuple(images.shape[1:]), dtype=self.dtype, device=images.device)
+            if self.dtype == torch.uint8:
+                self.scratch = torch.empty_like(images[0])
+
+        sources = []  # per batch position: ('pool', slot) for a stored image, ('batch', position) for a new one
+        written = {}  # pool slot -> batch position of the new image stored there
+        for i in range(len(images)):
+            source = ('batch', i)
+            if self.num_imgs < self.pool_size:
+                written[self.num_imgs] = i
+                self.num_imgs += 1
+            elif random.uniform(0, 1) > 0.5:
+                slot = random.randint(0, self.pool_size - 1)
+                # a slot swapped twice within the batch returns the image stored there a moment ago
+                source = ('batch', written[slot]) if slot in written else ('pool', slot)
+                written[slot] = i
+            sources.append(source)
+
+        result = images
+        if any(source != ('batch', i) for i, source in enumerate(sources)):
+            result = torch.empty_like(images)  # copied row by row: no temporary gathered batch
+            for i, (kind, index) in enumerate(sources):
+                if kind == 'pool':
+                    self.decode_into(result[i], self.images[index])
+                else:
+                    result[i].copy_(images[index])
+        for slot, i in written.items():
+            self.encode_into(self.images[slot], images[i])
+        return result
+
+    def encode_into(self, stored, image):
+        """Writes an image in -1..1 into a slot of the pool, converted to its storage dtype."""
+        if self.dtype == torch.uint8:
+            image = torch.add(image, 1, out=self.scratch).mul_(127.5).round_()
+        stored.copy_(image)
+
+    def decode_into(self, image, stored):
+        """Writes a stored image into `image`, converted back to the dtype of `image`."""
+        image.copy_(stored)
+        if self.dtype == torch.uint8:
+            image.div_(127.5).sub_(1)
+
+
 class CycleGANModel(BaseModel):
     """
     This class implements the CycleGAN model, for learning image-to-image translation without paired data.
@@ -41,6 +217,10 @@ class CycleGANModel(BaseModel):
             parser.add_argument('--lambda_A', type=float, default=10.0, help='weight for cycle loss (A -> B -> A)')
             parser.add_argument('--lambda_B', type=float, default=10.0, help='weight for cycle loss (B -> A -> B)')
             parser.add_argument('--lambda_identity', type=float, default=0.5, help='use identity mapping. Setting lambda_identity other than 0 has an effect of scaling the weight of the identity mapping loss. For example, if the weight of the identity loss should be 10 times smaller than the weight of the reconstruction loss, please set lambda_identity = 0.1')
+            parser.add_argument('--mixed_precision', type=str, default='none', choices=['none', 'bf16', 'fp16'], help='run the networks under autocast in bfloat16 (CPU) or float16 (GPU, with dynamic loss scaling); losses and thresholds stay float32')
+            parser.add_argument('--profile_interval', type=int, default=0, help='record wall time and peak memory of every training phase and append their statistics over this many iterations to phase_profile.jsonl (0: off)')
+            parser.add_argument('--profile_trace_steps', type=str, default='', help='write a torch profiler trace of these iterations, e.g. 20,21 (trace_step<n>.json)')
+            parser.add_argument('--pool_dtype', type=str, default='float32', choices=['float32', 'float16', 'uint8'], help='storage type of the generated images in the image pools (float16 halves, uint8 quarters their memory)')
 
         return parser
 
@@ -52,6 +232,14 @@ class CycleGANModel(BaseModel):
         """
         BaseModel.__init__(self, opt)
         self.counter = 0
+        # time spent between training steps (mostly waiting for the next batch) and in the steps, reported every print_freq images
+        self.data_time = self.step_time = 0.0
+        self.timed_steps = 0
+        self.timed_images = 0  # counted like total_iters of train.py, so the report follows the loss log
+        self.reported_steps = 0  # timed_steps at the last report
+        self.last_step_end = None
+        # networks run in this dtype under autocast (--mixed_precision), None for float32
+        self.amp_dtype = {'bf16': torch.bfloat16, 'fp16': torch.float16}.get(getattr(opt, 'mixed_precision', 'none'))
         # specify the training losses you want to print out. The training/test scripts will call <BaseModel.get_current_losses>
         self.loss_names = ['D_A', 'G_A', 'cycle_A', 'idt_A', 'D_B', 'G_B', 'cycle_B', 'idt_B']
         # specify the images you want to save/display. The training/test scripts will call <BaseModel.get_current_visuals>
@@ -85,8 +273,9 @@ class CycleGANModel(BaseModel):
         if self.isTrain:
             if opt.lambda_identity > 0.0:  # only works when input and output images have the same number of channels
                 assert(opt.input_nc == opt.output_nc)
-            self.fake_A_pool = ImagePool(opt.pool_size)  # create image buffer to store previously generated images
-            self.fake_B_pool = ImagePool(opt.pool_size)  # create image buffer to store previously generated images
+            pool_dtype = {'float32': torch.float32, 'float16': torch.float16, 'uint8': torch.uint8}[getattr(opt, 'pool_dtype', 'float32')]
+            self.fake_A_pool = TensorImagePool(opt.pool_size, pool_dtype)  # create image buffer to store previously generated images
+            self.fake_B_pool = TensorImagePool(opt.pool_size, pool_dtype)  # create image buffer to store previously generated images
             # define loss functions
             self.criterionGAN = networks.GANLoss(opt.gan_mode).to(self.device)  # define GAN loss.
             self.criterionCycle = torch.nn.L1Loss()
@@ -96,6 +285,12 @@ class CycleGANModel(BaseModel):
             self.optimizer_D = torch.optim.Adam(itertools.chain(self.netD_A.parameters(), self.netD_B.parameters()), lr=opt.lr, betas=(opt.beta1, 0.999))
             self.optimizers.append(self.optimizer_G)
             self.optimizers.append(self.optimizer_D)
+            # float16 gradients underflow without loss scaling; bfloat16 has the exponent range of float32 and needs none
+            self.scaler = torch.amp.GradScaler(self.device.type, enabled=self.amp_dtype == torch.float16)
+            # per-phase time and memory of the training steps, written next to loss_log.txt
+            trace_steps = [int(step) for step in getattr(opt, 'profile_trace_steps', '').split(',') if step.strip()]
+            self.profiler = PhaseProfiler(os.path.join(self.save_dir, 'phase_profile.jsonl'), getattr(opt, 'profile_interval', 0),
+                                          self.device, trace_steps)
 
     def set_input(self, input):
         """Unpack input data from the dataloader and perform necessary pre-processing steps.
@@ -105,6 +300,10 @@ class CycleGANModel(BaseModel):
 
         The option 'direction' can be used to swap domain A and domain B.
         """
+        if self.last_step_end is not None:
+            waited = time.perf_counter() - self.last_step_end
+            self.data_time += waited
+            self.profiler.add('data', waited)
         AtoB = self.opt.direction == 'AtoB'
         self.real_A = input['A' if AtoB else 'B'].to(self.device)
         self.real_B = input['B' if AtoB else 'A'].to(self.device)
@@ -112,35 +311,38 @@ class CycleGANModel(BaseModel):
 
 
     # Added for the sketch to real image project
-    def convert_to_black_white(self,tensor, threshold):
+    def convert_to_black_white(self,tensor, threshold, out=None):
         """
         This function is necessary to binarize images from dataset A before processing them in a classifier or generator.
         It ensures that the fakeA images are the same as realA images and no information from the original B image is carried through noise.
-        
+
         Parameters:
             tensor (torch.Tensor): Input tensor with shape [B, 3, H, W].
             threshold (float): only if all three chanels RGB are below this threshold this pixel becomes black, else it will be white.
-        
+            out (torch.Tensor): Optional tensor with the shape of `tensor` to write the result into; `out=tensor` binarizes in place.
+                                Only for tensors that do not require gradients.
+
         Returns:
             torch.Tensor: Image tensor that is all black and white only.
         """
 
-        # Mask for black pixels: All three channels must be < threshold
-        mask = (tensor < threshold).all(dim=1, keepdim=True)  # Adjust shape
+        # Mask for black pixels: All three channels must be < threshold, i.e. the brightest one
+        mask = tensor.amax(dim=1, keepdim=True) < threshold  # [B, 1, H, W]
 
-        # Create a copy of the tensor to avoid modifying original data
-        tensor = tensor.clone()
-
-        # Set pixels: Black (-1) if all channels meet the condition, otherwise White (1)
-        tensor[mask.expand_as(tensor)] = -1  # Black
-        tensor[~mask.expand_as(tensor)] = 1  # White
-     
-        return tensor
+        # Set pixels in the only full-size tensor: the mask broadcast to all channels (1/0) becomes Black (-1) or White (1).
+        # The result only depends on the mask, so no gradient flows back into the input (as before with the overwritten copy).
+        if out is None:
+            out = torch.empty_like(tensor)
+        return out.copy_(mask.expand_as(out)).mul_(-2).add_(1)
     
     # Added for the sketch to real image project
     def add_salt_and_pepper_noise(self,image_tensor, prob=0.5):
         """
         Adds salt-and-pepper noise to an image tensor.
+
+        Every sample of the batch gets its own noise: one uniform random value per pixel decides whether the pixel
+        (all channels) becomes white (below prob / 2), black (at or above 1 - prob / 2) or stays. For noise in the
+        data loader workers, with stroke jitter and dropout, see sketch_noise.py.
         
         Parameters:
             image_tensor (torch.Tensor): Input tensor with shape [B, 3, H, W].
@@ -149,33 +351,34 @@ class CycleGANModel(BaseModel):
         Returns:
             torch.Tensor: Image tensor with added salt-and-pepper noise.
         """
-        
-        noisy_image = image_tensor.clone()
-        batch, channels, height, width = noisy_image.shape
-        
-        # Create masks for salt and pepper noise
-        num_pixels = height * width
-        num_salt = int(prob * num_pixels / 2)
-        num_pepper = int(prob * num_pixels / 2)
-        
-        # Add salt (white)
-        salt_coords = (torch.randint(0, height, (num_salt,)), torch.randint(0, width, (num_salt,)))
-        noisy_image[:, :, salt_coords[0], salt_coords[1]] = 1.0
-        
-        # Add pepper (black)
-        pepper_coords = (torch.randint(0, height, (num_pepper,)), torch.randint(0, width, (num_pepper,)))
-        noisy_image[:, :, pepper_coords[0], pepper_coords[1]] = -1.0
-        
-        return noisy_image
+        batch, channels, height, width = image_tensor.shape
+        uniform = torch.rand(batch, 1, height, width, device=image_tensor.device)
+        # Both masks in one pass over the image: clamping to [1, 1] adds salt (white), to [-1, -1] pepper (black)
+        lower = (uniform < prob / 2).to(image_tensor.dtype).mul_(2).sub_(1)
+        upper = (uniform < 1 - prob / 2).to(image_tensor.dtype).mul_(2).sub_(1)
+        return image_tensor.clamp(lower, upper)
+
+    # Added for the sketch to real image project
+    def run_net(self, net, input):
+        """
+        Runs a network, under autocast in the dtype of --mixed_precision if it is set.
+
+        The output is returned in float32, so the losses, the image pools and the thresholds of convert_to_black_white
+        compute exactly as without mixed precision; only the layers inside the network run in reduced precision.
+        """
+        if self.amp_dtype is None:
+            return net(input)
+        with torch.autocast(self.device.type, dtype=self.amp_dtype):
+            return net(input).float()
 
     def forward(self):
         """Run forward pass; called by both functions <optimize_parameters> and <test>."""
-        self.real_A = self.convert_to_black_white(self.real_A,0.03) # ensures sketches are only black(-1) and white (1); Added for the sketch to real image project
-        self.fake_B = self.netG_A(self.real_A)  # G_A(A)
-        self.rec_A = self.netG_B(self.fake_B)   # G_B(G_A(A))
-        self.fake_A = self.netG_B(self.real_B)  # G_B(B)
+        self.real_A = self.convert_to_black_white(self.real_A,0.03, out=self.real_A) # ensures sketches are only black(-1) and white (1); Added for the sketch to real image project
+        self.fake_B = self.run_net(self.netG_A, self.real_A)  # G_A(A)
+        self.rec_A = self.run_net(self.netG_B, self.fake_B)   # G_B(G_A(A))
+        self.fake_A = self.run_net(self.netG_B, self.real_B)  # G_B(B)
         tensor_fake_A = self.convert_to_black_white(self.fake_A ,0.03) # Added for the sketch to real image project
-        self.rec_B = self.netG_A(tensor_fake_A)   # G_A(G_B(B))
+        self.rec_B = self.run_net(self.netG_A, tensor_fake_A)   # G_A(G_B(B))
 
     def backward_D_basic(self, netD, real, fake):
         """Calculate GAN loss for the discriminator
@@ -189,25 +392,29 @@ class CycleGANModel(BaseModel):
         We also call loss_D.backward() to calculate the gradients.
         """
         # Real
-        pred_real = netD(real)
+        pred_real = self.run_net(netD, real)
         loss_D_real = self.criterionGAN(pred_real, True)
         # Fake
-        pred_fake = netD(fake.detach())
+        pred_fake = self.run_net(netD, fake.detach())
         loss_D_fake = self.criterionGAN(pred_fake, False)
         # Combined loss and calculate gradients
         loss_D = (loss_D_real + loss_D_fake) * 0.5
-        loss_D.backward()
+        self.scaler.scale(loss_D).backward()
         return loss_D
 
     def backward_D_A(self):
         """Calculate GAN loss for discriminator D_A"""
-        fake_B = self.fake_B_pool.query(self.fake_B)
-        self.loss_D_A = self.backward_D_basic(self.netD_A, self.real_B, fake_B)
+        with self.profiler.phase('pool_B'):
+            fake_B = self.fake_B_pool.query(self.fake_B)
+        with self.profiler.phase('backward_D_A'):
+            self.loss_D_A = self.backward_D_basic(self.netD_A, self.real_B, fake_B)
 
     def backward_D_B(self):
         """Calculate GAN loss for discriminator D_B"""
-        fake_A = self.fake_A_pool.query(self.fake_A)
-        self.loss_D_B = self.backward_D_basic(self.netD_B, self.real_A, fake_A)
+        with self.profiler.phase('pool_A'):
+            fake_A = self.fake_A_pool.query(self.fake_A)
+        with self.profiler.phase('backward_D_B'):
+            self.loss_D_B = self.backward_D_basic(self.netD_B, self.real_A, fake_A)
 
     def backward_G(self):
         """Calculate the loss for generators G_A and G_B"""
@@ -217,41 +424,69 @@ class CycleGANModel(BaseModel):
         # Identity loss
         if lambda_idt > 0:
             # G_A should be identity if real_B is fed: ||G_A(B) - B||
-            self.idt_A = self.netG_A(self.real_B)
+            self.idt_A = self.run_net(self.netG_A, self.real_B)
             self.loss_idt_A = self.criterionIdt(self.idt_A, self.real_B) * lambda_B * lambda_idt
             # G_B should be identity if real_A is fed: ||G_B(A) - A||
-            self.idt_B = self.netG_B(self.real_A)
+            self.idt_B = self.run_net(self.netG_B, self.real_A)
             self.loss_idt_B = self.criterionIdt(self.idt_B, self.real_A) * lambda_A * lambda_idt
         else:
             self.loss_idt_A = 0
             self.loss_idt_B = 0
 
         # GAN loss D_A(G_A(A))
-        self.loss_G_A = self.criterionGAN(self.netD_A(self.fake_B), True)
+        self.loss_G_A = self.criterionGAN(self.run_net(self.netD_A, self.fake_B), True)
         # GAN loss D_B(G_B(B))
-        self.loss_G_B = self.criterionGAN(self.netD_B(self.fake_A), True)
+        self.loss_G_B = self.criterionGAN(self.run_net(self.netD_B, self.fake_A), True)
         # Forward cycle loss || G_B(G_A(A)) - A||
         self.loss_cycle_A = self.criterionCycle(self.rec_A, self.real_A) * lambda_A
         # Backward cycle loss || G_A(G_B(B)) - B||
         self.loss_cycle_B = self.criterionCycle(self.rec_B, self.real_B) * lambda_B
         # combined loss and calculate gradients
         self.loss_G = self.loss_G_A + self.loss_G_B + self.loss_cycle_A + self.loss_cycle_B + self.loss_idt_A + self.loss_idt_B
-        self.loss_G.backward()
+        self.scaler.scale(self.loss_G).backward()
 
     def optimize_parameters(self):
         """Calculate losses, gradients, and update network weights; called in every training iteration"""
+        step_start = time.perf_counter()
+        self.profiler.start_step(self.timed_steps + 1)
         self.counter =+1
         # forward
-        self.forward()      # compute fake images and reconstruction images.
+        with self.profiler.phase('forward'):
+            self.forward()      # compute fake images and reconstruction images.
         # G_A and G_B
         self.set_requires_grad([self.netD_A, self.netD_B], False)  # Ds require no gradients when optimizing Gs
-        self.optimizer_G.zero_grad()  # set G_A and G_B's gradients to zero
-        self.backward_G()             # calculate gradients for G_A and G_B
-        self.optimizer_G.step()       # update G_A and G_B's weights
+        with self.profiler.phase('backward_G'):
+            self.optimizer_G.zero_grad()  # set G_A and G_B's gradients to zero
+            self.backward_G()             # calculate gradients for G_A and G_B
+        with self.profiler.phase('optimizer_G'):
+            self.scaler.step(self.optimizer_G)  # update G_A and G_B's weights (skipped if the scaled gradients overflowed)
         # D_A and D_B
         self.set_requires_grad([self.netD_A, self.netD_B], True)
         self.optimizer_D.zero_grad()   # set D_A and D_B's gradients to zero
         self.backward_D_A()      # calculate gradients for D_A
         if self.counter == 1 or self.counter %10 ==0: # this ensures less updates for discriminator B Added for the sketch to real image project
             self.backward_D_B()      # calculate graidents for D_B
-        self.optimizer_D.step()  # update D_A and D_B's weights
+        with self.profiler.phase('optimizer_D'):
+            self.scaler.step(self.optimizer_D)  # update D_A and D_B's weights
+            self.scaler.update()     # adapt the loss scale of --mixed_precision fp16; no-op otherwise
+        self.report_data_time(step_start)
+        self.profiler.end_step(self.timed_steps)
+
+    # Added for the sketch to real image project
+    def report_data_time(self, step_start):
+        """Adds up the time of a training step and prints every print_freq images how long the steps waited for their data.
+
+        The waiting time is measured from the end of a step to the next call of set_input, so it also contains the
+        logging of the training loop. A high share means the training is input-bound (see cached_unaligned_dataset.py).
+        """
+        self.last_step_end = time.perf_counter()
+        self.step_time += self.last_step_end - step_start
+        self.timed_steps += 1
+        self.timed_images += getattr(self.opt, 'batch_size', self.real_A.size(0))
+        if self.timed_images % getattr(self.opt, 'print_freq', 100) == 0:
+            steps = self.timed_steps - self.reported_steps
+            share = 100 * self.data_time / (self.data_time + self.step_time)
+            print('(data loading: %.1f ms per iteration, training step: %.1f ms, %.1f%% of the time waiting for data)'
+                  % (1000 * self.data_time / steps, 1000 * self.step_time / steps, share))
+            self.data_time = self.step_time = 0.0
+            self.reported_steps = self.timed_steps
@@ -12,17 +12,26 @@ It systematically loads different model checkpoints, runs inference using the `t
 5. Copies important model-related files (`train_opt.txt`, `test_opt.txt`, `loss_log.txt`).
 6. Moves the tested checkpoint into a `model` subfolder for documentation.
 
+With `--in_process` the evaluation runs in this process instead: the test images are loaded once, every
+checkpoint is loaded into the same generator and the test set runs through it in batches. The results are
+written directly into the per-checkpoint folders (same images and `index.html` as `test.py`), and
+`--workers` spreads the checkpoints over several processes.
+
 ## Usage:
 Run the script from the command line:
 
-    python evaluate.py <motive_name> <testset> <model_folder> <generator>
-    
+    python evaluate.py <motive_name> <testset> <model_folder> <generator> [--in_process] [--batch_size <n>] [--workers <n>] [--num_test <n>]
+
 
 ### Parameters:
 - `<motive_name>`: Name of the dataset/motive (e.g., `"car"`, `"butterfly"`).
 - `<testset>`: Test set to use (`"A"` or `"B"`).
 - `<model_folder>`: Folder containing the trained models (e.g., `"car_cyclegan"`).
 - `<generator>`: Which generator to evaluate (`"G_A"` or `"G_B"`).
+- `--in_process`: (Optional) Evaluate all checkpoints in this process instead of running `test.py` for each.
+- `--batch_size`: (Optional) Test images per forward pass in `--in_process` mode. Defaults to 8.
+- `--workers`: (Optional) Processes the checkpoints are spread over in `--in_process` mode. Defaults to 1.
+- `--num_test`: (Optional) Number of test images in `--in_process` mode, like `test.py`. Defaults to 50.
 
 ### Example:
     python evaluate.py car A car_cyclegan G_A
@@ -35,10 +44,31 @@ This will:
 """
 
 import os
+import sys
 import shutil
 import subprocess
 import argparse
+import multiprocessing
+import numpy as np
 import torch
+from PIL import Image
+
+from interaction.checkpoints import define_generator, load_generator_weights
+from sketch_samples import IMAGE_SIZE, load_test_images
+
+
+
+def result_folder(repo_dir, model_folder, mod_i):
+    """Returns a new unique result folder for a checkpoint (e.g. `results/car_cyclegan/latest_net_G_A_car_cyclegan`)."""
+    mod_i_name = mod_i.replace(".pth", "")
+    mod_result_name = f"{mod_i_name}_{model_folder}" if len(model_folder) <= 20 else mod_i_name
+    mod_result_path = f"{repo_dir}/results/{model_folder}/{mod_result_name}"
+
+    counter = 2
+    while os.path.exists(mod_result_path):
+        mod_result_path = f"{repo_dir}/results/{model_folder}/{mod_result_name}_{counter}"
+        counter += 1
+    return mod_result_path
 
 def evaluate_models(motive_name, testset, model_folder, generator):
 
@@ -83,14 +113,7 @@ def evaluate_models(motive_name, testset, model_folder, generator):
             continue  # Proceed to the next iteration
 
         # Create a new unique name for the folder
-        mod_i_name = mod_i.replace(".pth", "")
-        mod_result_name = f"{mod_i_name}_{model_folder}" if len(model_folder) <= 20 else mod_i_name
-        mod_result_path = f"{repo_dir}/results/{model_folder}/{mod_result_name}"
-        
-        counter = 2
-        while os.path.exists(mod_result_path):
-            mod_result_path = f"{repo_dir}/results/{model_folder}/{mod_result_name}_{counter}"
-            counter += 1
+        mod_result_path = result_folder(repo_dir, model_folder, mod_i)
 
         # Rename `test_latest` folder to the specific model folder
         os.rename(results_path, mod_result_path)
@@ -98,12 +121,126 @@ def evaluate_models(motive_name, testset, model_folder, generator):
 
     print("Transformation completed.")
 
+
+def import_cyclegan(repo_dir):
+    """Makes the packages of the original CycleGAN repository importable and returns `networks` and `html`."""
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)
+    from models import networks
+    from util import html
+    return networks, html
+
+
+def tensor_to_arrays(tensor):
+    """Converts a batch [N, 3, H, W] in -1..1 into uint8 images [N, H, W, 3] (like util.tensor2im)."""
+    arrays = tensor.cpu().float().numpy()
+    return ((np.transpose(arrays, (0, 2, 3, 1)) + 1) / 2.0 * 255.0).astype(np.uint8)
+
+
+def build_generator(networks, device):
+    """Builds the ResNet generator of the test model once; checkpoints are loaded into it afterwards."""
+    net = define_generator(networks)
+    net.to(device)
+    net.eval()
+    return net
+
+
+def evaluate_checkpoint(net, html, checkpoint_path, result_path, title, names, images, batch_size, device):
+    """Runs the test images through one checkpoint and writes the real/fake images and index.html to its result folder."""
+    load_generator_weights(net, checkpoint_path, device)
+    webpage = html.HTML(result_path, title)
+    image_dir = webpage.get_image_dir()
+
+    with torch.inference_mode():
+        for start in range(0, len(names), batch_size):
+            real = images[start:start + batch_size]
+            fake = net(real.to(device))
+            for name, real_array, fake_array in zip(names[start:start + batch_size], tensor_to_arrays(real), tensor_to_arrays(fake)):
+                webpage.add_header(name)
+                ims = []
+                for label, array in (("real", real_array), ("fake", fake_array)):
+                    image_name = f"{name}_{label}.png"
+                    Image.fromarray(array).save(os.path.join(image_dir, image_name))
+                    ims.append(image_name)
+                webpage.add_images(ims, ["real", "fake"], ims, width=IMAGE_SIZE)
+    webpage.save()
+    print(f"{os.path.basename(checkpoint_path)} evaluated, results in {result_path}")
+
+
+# State of a worker process, set once by `_init_worker`
+_worker = {}
+
+
+def _init_worker(repo_dir, names, images, batch_size, threads):
+    """Prepares a worker process: one generator and the test images for all of its checkpoints."""
+    torch.set_num_threads(threads)
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    networks, html = import_cyclegan(repo_dir)
+    _worker.update(net=build_generator(networks, device), html=html, device=device,
+                   names=names, images=images, batch_size=batch_size)
+
+
+def _evaluate_checkpoint_task(task):
+    """Pool task: evaluates one (checkpoint path, result path, title)."""
+    checkpoint_path, result_path, title = task
+    evaluate_checkpoint(_worker["net"], _worker["html"], checkpoint_path, result_path, title,
+                        _worker["names"], _worker["images"], _worker["batch_size"], _worker["device"])
+
+
+def evaluate_models_in_process(motive_name, testset, model_folder, generator, batch_size=8, workers=1, num_test=50):
+    """Evaluates all checkpoints with one generator per process instead of one `test.py` run per checkpoint."""
+    repo_dir = os.path.abspath("Orginal_CycleGAN_Repository")
+    dataroot_path = os.path.join(repo_dir, f"datasets/{motive_name}/test{testset}")
+    repo_model_folder_path = os.path.join(repo_dir, f"checkpoints/{model_folder}")
+
+    # Find all relevant model files
+    models = sorted(f for f in os.listdir(repo_model_folder_path) if f.endswith(f"_net_{generator}.pth"))
+
+    if not models:
+        print("No matching models found.")
+        return
+
+    # The test set is loaded only once and shared by all checkpoints (and handed to the workers)
+    names, images = load_test_images(dataroot_path, num_test)
+    print(f"{len(names)} test images loaded from {dataroot_path}")
+
+    # Result folders are created up front, so parallel workers never pick the same name
+    tasks = []
+    for mod_i in models:
+        mod_result_path = result_folder(repo_dir, model_folder, mod_i)
+        os.makedirs(mod_result_path)
+        title = f"Experiment = {model_folder}, Phase = test{testset}, Checkpoint = {mod_i}"
+        tasks.append((os.path.join(repo_model_folder_path, mod_i), mod_result_path, title))
+
+    workers = max(1, min(workers, len(tasks)))
+    threads = max(1, torch.get_num_threads() // workers)
+    if workers == 1:
+        _init_worker(repo_dir, names, images, batch_size, torch.get_num_threads())
+        for task in tasks:
+            _evaluate_checkpoint_task(task)
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(repo_dir, names, images, batch_size, threads)) as pool:
+            for _ in pool.imap_unordered(_evaluate_checkpoint_task, tasks):
+                pass
+
+    print("Transformation completed.")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Dynamic model run")
     parser.add_argument("motive_name", type=str, help="Name of the motive")
     parser.add_argument("testset", type=str, choices=["A", "B"], help="Test set (A or B)")
     parser.add_argument("model_folder", type=str, help="Name of the model folder")
     parser.add_argument("generator", type=str, choices=["G_A", "G_B"], help="Generator (G_A or G_B)")
+    parser.add_argument("--in_process", action="store_true", help="Evaluate all checkpoints in this process instead of running test.py for each")
+    parser.add_argument("--batch_size", type=int, default=8, help="Test images per forward pass (with --in_process)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes the checkpoints are spread over (with --in_process)")
+    parser.add_argument("--num_test", type=int, default=50, help="Number of test images, like test.py (with --in_process)")
 
     args = parser.parse_args()
-    evaluate_models(args.motive_name, args.testset, args.model_folder, args.generator)
+    if args.in_process:
+        evaluate_models_in_process(args.motive_name, args.testset, args.model_folder, args.generator,
+                                   args.batch_size, args.workers, args.num_test)
+    else:
+        evaluate_models(args.motive_name, args.testset, args.model_folder, args.generator)
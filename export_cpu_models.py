@@ -0,0 +1,71 @@
+"""
+CPU Export of the Sketch2RealImage Generators
+
+This script writes optimized CPU variants of the generators in `interaction/models` next to their checkpoints.
+The app loads them per model with the environment variable `SKETCHPAD_MODEL_VARIANTS` (see `interaction/variants.py`).
+
+## Variants:
+- `traced`: frozen TorchScript graph of the fp32 generator (`<name>_net_G.traced.pt`). Same output up to float rounding.
+- `int8`: static int8 quantization (FX graph mode, x86 backend) of convolutions, InstanceNorm and the residual
+  blocks, traced like `traced` (`<name>_net_G.int8.pt`). The activation ranges are calibrated on sketches.
+  Dynamic quantization is not offered: it only covers Linear and recurrent layers, which the generator does not have.
+- `channels_last` and `compiled` (`torch.compile`) need no export; the app applies them when a model is loaded.
+
+`python benchmark.py variants` reports the pixel difference to the fp32 output and the speedup of every variant.
+
+## Usage:
+    python export_cpu_models.py [--models <name> ...] [--variants traced int8] [--calibration <folder>] [--num_calibration <n>]
+
+### Parameters:
+- `--models`: (Optional) Models to export (e.g. `car`). Defaults to all `*_net_G.pth` in `--model_dir`.
+- `--variants`: (Optional) Variants to write. Defaults to `traced int8`.
+- `--calibration`: (Optional) Folder of training sketches (e.g. `datasets/car/trainA`) for the int8 calibration.
+  Defaults to random QuickDraw-like strokes.
+- `--num_calibration`: (Optional) Number of calibration sketches. Defaults to 64.
+- `--model_dir`: (Optional) Folder of the checkpoints. Defaults to `interaction/models`; the app copies the
+  exported files from there together with the checkpoints.
+
+### Example:
+    python export_cpu_models.py --models car --calibration Orginal_CycleGAN_Repository/datasets/car/trainA
+    SKETCHPAD_MODEL_VARIANTS=car=int8 python app.py
+"""
+
+import argparse
+import os
+
+import torch
+
+from interaction.variants import EXPORTED_VARIANTS, export_traced, export_int8, variant_path
+from sketch_samples import load_sketches
+
+
+def export_model(registry, model_name, variants, calibration):
+    """Writes the exported variants of one model and returns their paths."""
+    net = registry.build_generator(model_name)
+    example = calibration[:1]
+    paths = []
+    for variant in variants:
+        exported = export_traced(net, example) if variant == "traced" else export_int8(net, calibration, example)
+        path = variant_path(registry.model_path(model_name), variant)
+        torch.jit.save(exported, path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export optimized CPU variants of the generators.")
+    parser.add_argument("--models", type=str, nargs="+", default=None, help="Models to export (default: all)")
+    parser.add_argument("--variants", type=str, nargs="+", default=list(EXPORTED_VARIANTS), choices=EXPORTED_VARIANTS,
+                        help="Variants to write")
+    parser.add_argument("--calibration", type=str, default=None, help="Folder of sketches for the int8 calibration")
+    parser.add_argument("--num_calibration", type=int, default=64, help="Number of calibration sketches")
+    parser.add_argument("--model_dir", type=str, default=os.path.join("interaction", "models"), help="Folder of the checkpoints")
+    args = parser.parse_args()
+
+    from interaction.registry import ModelRegistry
+
+    registry = ModelRegistry(os.path.abspath(args.model_dir), device="cpu", variants="fp32")
+    calibration = load_sketches(args.calibration, args.num_calibration)
+    for model_name in args.models or registry.available_models():
+        for path in export_model(registry, model_name, args.variants, calibration):
+            print(f"{model_name}: {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
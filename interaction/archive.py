@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+import time
+
+from interaction.helpers import output_image_path_app, result_index_path
+
+
+class ResultArchive:
+    """Stores every result as numbered PNG files ('<n>_real.png', '<n>_fake.png') with a SQLite index.
+
+    The index hands out the numbers (an AUTOINCREMENT key, so parallel requests and processes never get
+    the same one) and maps result IDs to their files, so neither numbering nor lookup scans the folder.
+    A folder from before the index is scanned once to continue its numbering.
+    """
+
+    kinds = {"input": "real", "output": "fake"}
+
+    def __init__(self, folder=output_image_path_app, index_path=result_index_path):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(index_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (number INTEGER PRIMARY KEY AUTOINCREMENT, "
+                             "result_id TEXT UNIQUE, model TEXT, created REAL)")
+            self._continue_numbering()
+
+    def add(self, input_png, output_png, result_id, model_name=None):
+        """Archives the input and generated image (PNG bytes) of a result and returns its number."""
+        with self._lock:
+            number = self._db.execute("INSERT INTO results (result_id, model, created) VALUES (?, ?, ?)",
+                                      (result_id, model_name, time.time())).lastrowid
+        for kind, data in ((self.kinds["input"], input_png), (self.kinds["output"], output_png)):
+            with open(os.path.join(self.folder, f"{number}_{kind}.png"), "wb") as f:
+                f.write(data)
+        return number
+
+    def path(self, result_id, kind):
+        """Returns the file of one image ("input" or "output") of an archived result, or None if it is unknown."""
+        if kind not in self.kinds:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT number FROM results WHERE result_id = ?", (result_id,)).fetchone()
+        return os.path.join(self.folder, f"{row[0]}_{self.kinds[kind]}.png") if row else None
+
+    def get(self, result_id, kind):
+        """Returns the PNG bytes of one image of an archived result, or None if it is unknown or missing."""
+        path = self.path(result_id, kind)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _continue_numbering(self):
+        """Starts the counter after the highest number in the folder when the index is new; needs the lock."""
+        self._db.execute("BEGIN IMMEDIATE")  # no other process may number results meanwhile
+        try:
+            started = self._db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'results'").fetchone()
+            if started is None:
+                numbers = [int(f.split("_")[0]) for f in os.listdir(self.folder)
+                           if f.endswith("_real.png") and f.split("_")[0].isdigit()]
+                self._db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('results', ?)", (max(numbers, default=0),))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from interaction.helpers import batch_max_size, batch_max_wait
+from interaction.inference import image_to_tensor, tensor_to_image
+from interaction.tiling import generate_tiled, needs_tiles
+
+
+class BatchScheduler:
+    """Collects concurrent sketches per model and runs them as one batched forward pass.
+
+    A batch is started as soon as `max_batch_size` sketches of one model are waiting or the oldest
+    of them has waited `max_wait` seconds. The generator normalizes every sample on its own
+    (InstanceNorm), so a batched result is identical to running the sketches one by one.
+    `offload(fn, *args)` can run the forward pass outside the worker, e.g. in an OS thread when
+    the worker is a green thread that must not block the other connections.
+    """
+
+    def __init__(self, engine, max_batch_size=batch_max_size, max_wait=batch_max_wait, offload=None):
+        self.engine = engine
+        self.offload = offload
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queues = {}  # (model name, input shape) -> [(enqueue time, tensor, future), ...]
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, model_name, tensor):
+        """Queues a preprocessed input [1, 3, H, W] and returns a Future for its output [3, H, W]."""
+        future = Future()
+        key = (model_name, tuple(tensor.shape[1:]))
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Batch scheduler is closed.")
+            self._queues.setdefault(key, []).append((time.monotonic(), tensor, future))
+            self._condition.notify()
+        return future
+
+    def transform(self, model_name, image):
+        """Transforms a preprocessed sketch into a generated image, batched with concurrent requests.
+
+        Other sizes than 256x256 are generated in tiles, which are queued like sketches of their own, so
+        a high-resolution request shares batches with others and never runs more than one batch at once.
+        """
+        tensor = image_to_tensor(image)
+        if needs_tiles(tensor):
+            return tensor_to_image(generate_tiled(tensor, lambda tiles: self.run_tiles(model_name, tiles)))
+        fake = self.submit(model_name, tensor).result()
+        return tensor_to_image(fake)
+
+    def run_tiles(self, model_name, tiles):
+        """Queues tiles [1, 3, tile, tile] and returns their outputs on the CPU."""
+        futures = [self.submit(model_name, tile.contiguous()) for tile in tiles]
+        return [future.result().cpu() for future in futures]
+
+    def close(self):
+        """Stops the worker after the current batch; queued requests are cancelled."""
+        with self._condition:
+            self._closed = True
+            for queue in self._queues.values():
+                for _, _, future in queue:
+                    future.cancel()
+            self._queues.clear()
+            self._condition.notify_all()
+        self._worker.join()
+
+    def _next_batch(self):
+        """Blocks until a batch is due and removes it from its queue."""
+        with self._condition:
+            while not self._closed:
+                if not self._queues:
+                    self._condition.wait()
+                    continue
+
+                # Full batches go first, otherwise the queue with the oldest waiting sketch
+                key = next((k for k, queue in self._queues.items() if len(queue) >= self.max_batch_size), None)
+                if key is None:
+                    key = min(self._queues, key=lambda k: self._queues[k][0][0])
+                    waited = time.monotonic() - self._queues[key][0][0]
+                    if waited < self.max_wait:
+                        self._condition.wait(self.max_wait - waited)
+                        continue
+
+                queue = self._queues[key]
+                batch, self._queues[key] = queue[:self.max_batch_size], queue[self.max_batch_size:]
+                if not self._queues[key]:
+                    del self._queues[key]
+                return key[0], batch
+        return None
+
+    def _run(self):
+        """Worker loop: runs due batches and hands every request its slice of the output."""
+        while True:
+            job = self._next_batch()
+            if job is None:
+                return
+            model_name, batch = job
+            pending = [(tensor, future) for _, tensor, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                batch_tensor = torch.cat([tensor for tensor, _ in pending])
+                if self.offload:
+                    fakes = self.offload(self.engine.run, model_name, batch_tensor)
+                else:
+                    fakes = self.engine.run(model_name, batch_tensor)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            for (_, future), fake in zip(pending, fakes):
+                future.set_result(fake)
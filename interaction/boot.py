@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class Lazy:
+    """Stands in for an object that is created on first use, so its heavy imports (torch) do not slow down the start.
+
+    Attribute access is forwarded to the object, which `factory()` creates once, also under concurrent access.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._object = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """Returns the object, creating it on the first call."""
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._factory()
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+class StartupTimer:
+    """Records when the phases of the app start are reached, in seconds since `start` (a time.perf_counter value)."""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases = OrderedDict()  # phase -> seconds since start, in the order they were reached
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Records the first time a phase is reached and prints it."""
+        with self._lock:
+            if phase in self.phases:
+                return
+            self.phases[phase] = elapsed = time.perf_counter() - self.start
+        print(f"Startup: {phase} after {elapsed:.2f} s")
+
+    def report(self):
+        """Returns the phases reached so far with their time in seconds."""
+        with self._lock:
+            return {phase: round(elapsed, 4) for phase, elapsed in self.phases.items()}
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from interaction.helpers import cache_memory_size, cache_disk_dir, cache_disk_size
+
+
+def result_key(input_image, model_name, model_version):
+    """Hashes the binarized input image together with the model name and checkpoint version (mtime)."""
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}|{model_version}|{input_image.mode}|{input_image.size}|".encode())
+    digest.update(input_image.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache for generated images (PNG bytes).
+
+    The first tier is an in-memory LRU limited to `memory_size` bytes. If `disk_dir` is set, every
+    entry is also written to disk, which is limited to `disk_size` bytes (least recently used removed
+    first) and survives restarts as well as being shared between workers.
+    """
+
+    def __init__(self, memory_size=cache_memory_size, disk_dir=cache_disk_dir, disk_size=cache_disk_size):
+        self.memory_size = memory_size
+        self.disk_dir = disk_dir
+        self.disk_size = disk_size
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> PNG bytes, least recently used first
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = [(entry.name[:-4], entry.stat()) for entry in os.scandir(self.disk_dir) if entry.name.endswith(".png")]
+            for key, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+                self._disk[key] = stat.st_size
+                self.disk_bytes += stat.st_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def get(self, key):
+        """Returns the cached PNG bytes for a key or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return self._memory[key]
+
+        # The file may also have been written by another worker, so the disk is asked directly
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._disk_path(key))
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    self.hits_disk += 1
+                    self._add_disk(key, len(data))
+                    self._put_memory(key, data)
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """Stores PNG bytes under a key in memory and, if enabled, on disk."""
+        with self._lock:
+            self._put_memory(key, data)
+            write_to_disk = self.disk_dir and key not in self._disk and len(data) <= self.disk_size
+        if write_to_disk and self._write_disk(key, data):
+            with self._lock:
+                self._add_disk(key, len(data))
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of both tiers."""
+        with self._lock:
+            requests = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / requests if requests else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+            }
+
+    def _put_memory(self, key, data):
+        """Inserts into the memory tier and drops least recently used entries; needs the lock."""
+        if key in self._memory:
+            self.memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.memory_size and self._memory:
+            _, old_data = self._memory.popitem(last=False)
+            self.memory_bytes -= len(old_data)
+
+    def _write_disk(self, key, data):
+        """Writes an entry file atomically, so other workers never read half a file."""
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"ERROR: Could not write cache entry {key}: {e}")
+            return False
+        return True
+
+    def _add_disk(self, key, size):
+        """Registers a written entry and enforces the disk size limit; needs the lock."""
+        if key in self._disk:
+            self.disk_bytes -= self._disk.pop(key)
+        self._disk[key] = size
+        self.disk_bytes += size
+        while self.disk_bytes > self.disk_size and self._disk:
+            old_key, old_size = self._disk.popitem(last=False)
+            self.disk_bytes -= old_size
+            try:
+                os.remove(self._disk_path(old_key))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,65 @@
+import threading
+
+from PIL import Image, ImageDraw
+
+from interaction.helpers import canvas_width, canvas_height, canvas_log_size, encode_png
+from interaction.strokes import unpack_segments
+
+
+class CanvasState:
+    """Authoritative state of the shared drawing canvas, for clients that join while others are drawing.
+
+    Every stroke message and reset sent to the clients is numbered and the stroke messages are kept in a
+    log. When the log grows beyond `log_size` bytes, it is compacted: its strokes are drawn onto a raster
+    snapshot of the canvas and the log starts over. A new client gets the snapshot (PNG) plus the log since
+    the snapshot, and ignores messages it receives with a seq that is already part of this state.
+    """
+
+    def __init__(self, width=canvas_width, height=canvas_height, log_size=canvas_log_size):
+        self.width = width
+        self.height = height
+        self.log_size = log_size
+        self.seq = 0  # number of the last stroke message
+        self.log_bytes = 0
+        self._log = []  # stroke messages since the snapshot, oldest first
+        self._snapshot = None  # PIL image of everything before the log, None for a blank canvas
+        self._snapshot_png = None
+        self._lock = threading.Lock()
+
+    def append(self, packed):
+        """Numbers a stroke message (adds "seq") and logs it; compacts the log if it exceeds the size limit."""
+        with self._lock:
+            self.seq += 1
+            packed["seq"] = self.seq
+            self._log.append(packed)
+            self.log_bytes += len(packed["points"])
+            if self.log_bytes > self.log_size:
+                self._compact()
+        return packed
+
+    def clear(self):
+        """Forgets all strokes after a reset of the canvas and returns the seq of the reset."""
+        with self._lock:
+            self.seq += 1
+            self._log = []
+            self.log_bytes = 0
+            self._snapshot = self._snapshot_png = None
+            return self.seq
+
+    def state(self):
+        """Returns what a new client needs: the snapshot (PNG bytes or None), the strokes since then and the last seq."""
+        with self._lock:
+            return {"seq": self.seq, "snapshot": self._snapshot_png, "strokes": list(self._log)}
+
+    def _compact(self):
+        """Draws the logged strokes onto the snapshot and empties the log; needs the lock."""
+        if self._snapshot is None:
+            self._snapshot = Image.new("L", (self.width, self.height), 255)
+        draw = ImageDraw.Draw(self._snapshot)
+        for packed in self._log:
+            for segment in unpack_segments(packed):
+                if len(segment) > 1:
+                    draw.line([tuple(point) for point in segment], fill=0, width=1)
+        self._snapshot_png = encode_png(self._snapshot)
+        self._log = []
+        self.log_bytes = 0
@@ -0,0 +1,32 @@
+import torch
+
+# Options matching `test.py --model test --no_dropout` with the default base options
+GENERATOR_OPTIONS = {
+    "input_nc": 3,
+    "output_nc": 3,
+    "ngf": 64,
+    "netG": "resnet_9blocks",
+    "norm": "instance",
+    "use_dropout": False,
+}
+
+
+def define_generator(networks):
+    """Builds the ResNet generator of the test model with the `networks` module of the CycleGAN submodule."""
+    return networks.define_G(GENERATOR_OPTIONS["input_nc"], GENERATOR_OPTIONS["output_nc"],
+                             GENERATOR_OPTIONS["ngf"], GENERATOR_OPTIONS["netG"],
+                             GENERATOR_OPTIONS["norm"], GENERATOR_OPTIONS["use_dropout"])
+
+
+def load_generator_weights(net, checkpoint_path, device):
+    """Loads the weights of a `*_net_G.pth` checkpoint into a generator like BaseModel.load_networks."""
+    state_dict = torch.load(checkpoint_path, map_location=str(device))
+    if hasattr(state_dict, "_metadata"):
+        del state_dict._metadata
+
+    # InstanceNorm layers without running stats must not receive them (see BaseModel.load_networks)
+    expected_keys = net.state_dict().keys()
+    state_dict = {key: value for key, value in state_dict.items()
+                  if key in expected_keys
+                  or not key.endswith(("running_mean", "running_var", "num_batches_tracked"))}
+    net.load_state_dict(state_dict)
@@ -1,13 +1,13 @@
 from flask import Flask, render_template, request, jsonify, send_file
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import base64
 import io
 import os
 from PIL import Image
-import subprocess
 import numpy as np
 import shutil
-import torch
+import math
+from prepare_ndjson import drawing_to_array
 
 
 #-----------------------------------------------------app preparation------------------------------
@@ -18,28 +18,98 @@ models_copied = False
 repo_dir = os.path.abspath("Orginal_CycleGAN_Repository")
 interaction_dir = os.path.abspath("interaction")
 
-# Paths for application images
-input_path_app = os.path.join(interaction_dir, "images", "input")
-upload_path_app = os.path.join(interaction_dir, "images", "upload")
-input_image_path_app = os.path.join(input_path_app, "input.png")
+# Path for archived application images and the index of their numbers and result IDs
 output_image_path_app = os.path.join(interaction_dir, "images", "all_images")
-upload_image_path_app = os.path.join(upload_path_app, "upload.png")
+result_index_path = os.environ.get("SKETCHPAD_RESULT_INDEX", os.path.join(output_image_path_app, "index.sqlite3"))
 
-# Paths for repository images
-input_image_path_repo = os.path.join(repo_dir, "datasets", "SketchPad", "testA", "input.png")
+# Paths for repository models
 model_target = os.path.join(repo_dir, "checkpoints", "SketchPad")
-output_image_path_repo = os.path.join(repo_dir, "results/SketchPad/test_latest/images")
+
+# RAM budget (bytes) for generators kept in memory; a resnet_9blocks generator needs about 45 MB
+model_memory_budget = int(os.environ.get("SKETCHPAD_MODEL_MEMORY_BUDGET", 1024 * 2**20))
+
+# Optimized CPU variant of the generators: "fp32", "channels_last", "compiled", "traced" or "int8" (the last two are
+# written by export_cpu_models.py), for all models or per model as "car=int8,butterfly=traced"
+model_variants = os.environ.get("SKETCHPAD_MODEL_VARIANTS", "fp32")
+
+# Fast boot: how the models get from 'interaction/models' into the checkpoint folder ("copy", "hardlink" or "symlink";
+# unchanged files are skipped) and the model loaded in the background at the start ("auto" for the first one, empty for none)
+model_link_mode = os.environ.get("SKETCHPAD_MODEL_LINK", "copy")
+prewarm_model = os.environ.get("SKETCHPAD_PREWARM_MODEL", "auto")
+
+# Micro-batching of concurrent requests: max sketches per forward pass and max wait (seconds) for a batch to fill
+batch_max_size = int(os.environ.get("SKETCHPAD_BATCH_MAX_SIZE", 8))
+batch_max_wait = float(os.environ.get("SKETCHPAD_BATCH_MAX_WAIT", 0.02))
+
+# Result cache for repeated sketches: memory tier size (bytes) and optional disk tier folder and size (bytes)
+cache_memory_size = int(os.environ.get("SKETCHPAD_CACHE_MEMORY_SIZE", 64 * 2**20))
+cache_disk_dir = os.environ.get("SKETCHPAD_CACHE_DIR") or None
+cache_disk_size = int(os.environ.get("SKETCHPAD_CACHE_DISK_SIZE", 1024 * 2**20))
+
+# Number of finished results kept in memory for /get_result, and seconds that results and finished jobs are kept
+result_store_size = int(os.environ.get("SKETCHPAD_RESULT_STORE_SIZE", 256))
+result_ttl = float(os.environ.get("SKETCHPAD_RESULT_TTL", 600))
+
+# Job API (/jobs): worker threads that run transformations (enough to fill a batch) and jobs that may wait or run at once; more are answered with 429
+job_workers = int(os.environ.get("SKETCHPAD_JOB_WORKERS", batch_max_size))
+job_queue_size = int(os.environ.get("SKETCHPAD_JOB_QUEUE_SIZE", 64))
+
+# Collaborative drawing: interval (seconds) in which stroke points are coalesced and their encoding ("float32" or "delta")
+stroke_tick = float(os.environ.get("SKETCHPAD_STROKE_TICK", 0.016))
+stroke_encoding = os.environ.get("SKETCHPAD_STROKE_ENCODING", "float32")
+
+# Server-side canvas for late joiners: size of the drawing canvas and memory (bytes) of the stroke log before it is compacted into a snapshot
+canvas_width, canvas_height = 1500, 700
+canvas_log_size = int(os.environ.get("SKETCHPAD_CANVAS_LOG_SIZE", 256 * 2**10))
+
+# Drawing rooms: room of clients that did not choose one, and number of canvases of empty rooms that are kept
+default_room = "lobby"
+max_rooms = int(os.environ.get("SKETCHPAD_MAX_ROOMS", 64))
+
+# Socket backend: "threading", or "eventlet"/"gevent" to hold many idle websocket connections in one process with green threads
+socketio_async_mode = os.environ.get("SKETCHPAD_ASYNC_MODE", "threading")
+
+# Largest drawing (number of points) accepted by /save_strokes
+max_stroke_points = int(os.environ.get("SKETCHPAD_MAX_STROKE_POINTS", 20000))
+
+# High-resolution output: sizes offered besides the 256x256 of the training data ("native" keeps the size of the
+# drawing, up to max_output_size pixels per side), and the tiles (size and overlap in pixels) larger inputs are generated in
+output_resolutions = (256, 512, 1024, "native")
+max_output_size = int(os.environ.get("SKETCHPAD_MAX_OUTPUT_SIZE", 2048))
+tile_size = int(os.environ.get("SKETCHPAD_TILE_SIZE", 256))
+tile_overlap = int(os.environ.get("SKETCHPAD_TILE_OVERLAP", 64))
 
 # Ensure necessary directories exist
-os.makedirs(input_path_app, exist_ok=True)
 os.makedirs(output_image_path_app, exist_ok=True)
-os.makedirs(upload_path_app, exist_ok=True)
 os.makedirs(model_target, exist_ok=True)
 
 
 
+def sync_model_file(source, target, mode=model_link_mode):
+    """Copies or links a model file into the checkpoint folder unless the target is already the same file; returns True if it was updated."""
+    if os.path.lexists(target):
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return False  # hardlink or symlink of the source
+        source_stat, target_stat = os.stat(source), os.lstat(target)
+        if mode == "copy" and (source_stat.st_size, source_stat.st_mtime_ns) == (target_stat.st_size, target_stat.st_mtime_ns):
+            return False  # copy2 keeps the mtime, so an unchanged size and mtime means an unchanged file
+        os.remove(target)
+
+    if mode == "symlink":
+        os.symlink(source, target)
+        return True
+    if mode == "hardlink":
+        try:
+            os.link(source, target)
+            return True
+        except OSError:
+            pass  # other file system, copy instead
+    shutil.copy2(source, target)  # with the mtime, which tells whether an exported variant belongs to the checkpoint
+    return True
+
+
 def copy_all_models_once():
-    """Copies all models from 'interaction/models/' to 'checkpoints/SketchPad/' once."""
+    """Copies all models from 'interaction/models/' to 'checkpoints/SketchPad/' once, skipping unchanged files."""
     global models_copied
 
     if models_copied:
@@ -53,34 +123,28 @@ def copy_all_models_once():
 
 
     # Copy all models
-    for file in os.listdir(model_source):
-        shutil.copy(os.path.join(model_source, file), model_target)
+    updated = [file for file in os.listdir(model_source)
+               if sync_model_file(os.path.join(model_source, file), os.path.join(model_target, file))]
+    if updated:
+        print(f"Models updated: {', '.join(sorted(updated))}")
 
     models_copied = True   # Prevent multiple copies
     return True
 
 
-def get_available_models():
-    """Returns a list of available models based on filenames."""
-    model_dir = os.path.abspath("Orginal_CycleGAN_Repository/checkpoints/SketchPad")
-
+def list_models(model_dir, suffix="_net_G.pth"):
+    """Returns the names of all generators in a folder (e.g. car_net_G.pth -> car), without loading torch."""
     if not os.path.exists(model_dir):
-        return ["No models found"]
-
-    available_models = [
-        file.replace("_net_G.pth", "") for file in os.listdir(model_dir) if file.endswith("_net_G.pth")
-    ]
-
-    return available_models if available_models else ["No models found"]
-
+        return []
+    return sorted(file[:-len(suffix)] for file in os.listdir(model_dir) if file.endswith(suffix))
 
 
 #-----------------------------------------------------image preparation------------------------------
-def get_next_image_number(output_image_path_app):
-    """Finds the next available number for saving output images."""
-    existing_numbers = [int(f.split("_")[0]) for f in os.listdir(output_image_path_app) 
-                        if f.endswith("_real.png") and f.split("_")[0].isdigit()]
-    return max(existing_numbers, default=0) + 1
+def encode_png(image):
+    """Encodes a PIL image as PNG bytes in memory."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 # image transformation
@@ -145,73 +209,71 @@ def convert_image_to_black_white_dynamic(image):
     # Convert back to PIL image
     return Image.fromarray(binary_image_array)
 
-def process_and_save_image(image):
+def process_input_image(image):
     """Processes an image by cropping, resizing, and centering on a white background."""
     processed_img = process_image(image)
-    processed_img = convert_image_to_black_white_dynamic(processed_img)
-    processed_img.save(input_image_path_app)
-    
-
+    return convert_image_to_black_white_dynamic(processed_img)
 
-#-----------------------------------------------------calling the model for transformation-----------------------------
-
-def rename_model(model_name):
-    """Returns a list of available models based on filenames."""
-    model_dir = os.path.abspath("Orginal_CycleGAN_Repository/checkpoints/SketchPad")
-    
-    latest_model = os.path.join(model_dir, "latest_net_G.pth")
-    new_model = os.path.join(model_dir, f"{model_name}_net_G.pth")
-
-    # Falls es bereits ein latest_net_G.pth gibt, benenne es zurück
-    if os.path.exists(latest_model):
-        os.rename(latest_model,new_model)
 
-    # Jetzt das neue Modell als latest_net_G.pth setzen
-    else:
+def parse_strokes(strokes):
+    """Checks stroke polylines in the QuickDraw format [[xs, ys], ...] and returns them with float coordinates."""
+    if not isinstance(strokes, list) or not strokes:
+        raise ValueError("No content found in the image.")
+    drawing, points = [], 0
+    for stroke in strokes:
+        if not isinstance(stroke, list) or len(stroke) != 2 or not isinstance(stroke[0], list) or not isinstance(stroke[1], list) \
+                or not stroke[0] or len(stroke[0]) != len(stroke[1]):
+            raise ValueError("Strokes must be given as [[x values], [y values]] of equal length.")
         try:
-            os.rename(new_model,latest_model)
-            print(f"{model_name}_net_G.pth wurde zu latest_net_G.pth umbenannt.")
-        except:
-            print(f"FEHLER: Datei {model_name}_net_G.pth nicht gefunden.")
+            xs, ys = [float(x) for x in stroke[0]], [float(y) for y in stroke[1]]
+        except (TypeError, ValueError):
+            raise ValueError("Stroke coordinates must be numbers.")
+        if not all(math.isfinite(v) for v in xs + ys):
+            raise ValueError("Stroke coordinates must be numbers.")
+        points += len(xs)
+        if points > max_stroke_points:
+            raise ValueError(f"The drawing has more than {max_stroke_points} points.")
+        drawing.append([xs, ys])
+
+    # The drawing is scaled to fill the image, which needs an extent in both directions
+    if max(max(xs) for xs, _ in drawing) == min(min(xs) for xs, _ in drawing) or \
+            max(max(ys) for _, ys in drawing) == min(min(ys) for _, ys in drawing):
+        raise ValueError("The drawing needs a width and a height.")
+    return drawing
+
+
+def parse_resolution(resolution):
+    """Checks a requested output resolution (see `output_resolutions`, default 256) and returns (size, native)."""
+    if resolution is None:
+        return 256, False
+    if str(resolution) == "native":
+        return max_output_size, True
+    if str(resolution) not in [str(r) for r in output_resolutions]:
+        raise ValueError(f"The resolution must be one of {', '.join(str(r) for r in output_resolutions)}.")
+    return int(resolution), False
+
+
+def process_input_strokes(strokes, size=256, native=False):
+    """Rasterizes stroke polylines like the QuickDraw training data (prepare_ndjson) into a black-and-white 256x256 image.
+
+    A larger `size` gives a size x size image with proportionally wider lines. With `native` the image gets the
+    extent of the drawing in canvas pixels plus a margin (scaled down into `size` if larger).
+    """
+    drawing = parse_strokes(strokes)
+    width = height = size
+    if native:
+        extent_x = max(max(xs) for xs, _ in drawing) - min(min(xs) for xs, _ in drawing)
+        extent_y = max(max(ys) for _, ys in drawing) - min(min(ys) for _, ys in drawing)
+        scale = min(1.0, (size - 10) / max(extent_x, extent_y))
+        width, height = math.ceil(extent_x * scale) + 10, math.ceil(extent_y * scale) + 10
+    line_width = max(2, round(2 * max(width, height) / 256))
+    return Image.fromarray(drawing_to_array(drawing, (width, height), line_width))
+    
 
 
-def run_model(model_name):
-    """Runs the selected model and saves the generated images."""
-    os.makedirs(os.path.dirname(input_image_path_repo), exist_ok=True)
-    shutil.copy(input_image_path_app, input_image_path_repo)
-    gpu_ids = "0" if torch.cuda.is_available() else "-1"  # GPU or CPU
+#-----------------------------------------------------calling the model for transformation-----------------------------
 
+def run_model(engine, model_name, input_image):
+    """Runs the selected model in-process and returns the generated image (engine or batch scheduler)."""
+    return engine.transform(model_name, input_image)
 
-    rename_model(model_name)
-    
-    # call test.py in the repository
-    command = [
-    "python", "test.py",
-    "--dataroot", "datasets/SketchPad",
-    "--name", "SketchPad",
-    "--model", "test",
-    "--no_dropout",
-    "--gpu_ids", gpu_ids,
-    ]
-
-    print("Starting model with command:", " ".join(command))
-    subprocess.run(command, cwd=repo_dir)
-
-    rename_model(model_name)
-
-    next_image_number = get_next_image_number(output_image_path_app)
-    for file in os.listdir(output_image_path_repo):
-        if file.endswith("_real.png"):
-            new_name = f"{next_image_number}_real.png"
-        elif file.endswith("_fake.png"):
-            new_name = f"{next_image_number}_fake.png"
-            shutil.copy(os.path.join(output_image_path_repo, file), upload_image_path_app)
-            print(f"Fake-Bild gespeichert als Upload: {upload_image_path_app}")
-        else:
-            continue
-        
-        shutil.copy(os.path.join(output_image_path_repo, file), os.path.join(output_image_path_app, new_name))
-
-    # remove all files to prepare folders for next transformation
-    shutil.rmtree(os.path.join(repo_dir, "results", model_name), ignore_errors=True)
-    shutil.rmtree(os.path.dirname(input_image_path_repo), ignore_errors=True)
@@ -0,0 +1,50 @@
+import numpy as np
+import torch
+from PIL import Image
+
+from interaction.helpers import batch_max_size
+from interaction.registry import ModelRegistry
+from interaction.tiling import generate_tiled, needs_tiles
+
+
+def image_to_tensor(image):
+    """Converts a PIL image to a normalized [1, 3, H, W] tensor like the single dataset of the repository."""
+    array = np.asarray(image.convert("RGB"), dtype=np.float32)
+    array = array / 127.5 - 1.0  # same as ToTensor() followed by Normalize((0.5,)*3, (0.5,)*3)
+    return torch.from_numpy(array.transpose(2, 0, 1).copy()).unsqueeze(0)
+
+
+def tensor_to_image(tensor):
+    """Converts a generator output tensor [3, H, W] in the range -1..1 back to a PIL image (like util.tensor2im)."""
+    array = tensor.detach().cpu().float().numpy()
+    array = (np.transpose(array, (1, 2, 0)) + 1) / 2.0 * 255.0
+    return Image.fromarray(array.astype(np.uint8))
+
+
+class InferenceEngine:
+    """Runs sketches in-process through the generators held by a model registry."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or ModelRegistry()
+        self.device = self.registry.device
+
+    def run(self, model_name, tensor):
+        """Runs a preprocessed input batch [B, 3, H, W] through the generator and returns the fake batch."""
+        net = self.registry.get(model_name)
+        with torch.inference_mode():
+            return net(tensor.to(self.device))
+
+    def transform(self, model_name, image):
+        """Transforms a preprocessed sketch into a generated image; other sizes than 256x256 are generated in tiles."""
+        tensor = image_to_tensor(image)
+        if needs_tiles(tensor):
+            return tensor_to_image(generate_tiled(tensor, lambda tiles: self.run_tiles(model_name, tiles)))
+        fake = self.run(model_name, tensor)
+        return tensor_to_image(fake[0])
+
+    def run_tiles(self, model_name, tiles, batch_size=batch_max_size):
+        """Runs tiles [1, 3, tile, tile] through the generator in batches and returns their outputs on the CPU."""
+        fakes = []
+        for start in range(0, len(tiles), batch_size):
+            fakes.extend(self.run(model_name, torch.cat(tiles[start:start + batch_size])).cpu())
+        return fakes
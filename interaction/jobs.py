@@ -0,0 +1,97 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from interaction.helpers import job_workers, job_queue_size, result_ttl
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit when the maximum number of jobs is already waiting or running."""
+
+
+class JobQueue:
+    """Runs transformation jobs in a bounded pool of worker threads and keeps their status by job ID.
+
+    A job is submitted as a function of its job ID and runs in one of `workers` threads, so the web
+    thread can answer right away. At most `max_pending` jobs wait or run at a time; `submit` raises
+    QueueFullError beyond that, which keeps an overloaded server responsive. Finished jobs (result or
+    error) are kept for `ttl` seconds.
+    """
+
+    def __init__(self, workers=job_workers, max_pending=job_queue_size, ttl=result_ttl):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs = OrderedDict()  # job id -> status dict
+        self._queue = deque()  # (job id, fn, notify) waiting for a worker, oldest first
+        self._finished = deque()  # (finish time, job id), oldest first
+        self._running = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def submit(self, fn, notify=None):
+        """Queues `fn(job_id)` and returns (job id, queue position); `notify(status)` is called once the job has ended."""
+        with self._condition:
+            self._expire()
+            if len(self._queue) + self._running >= self.max_pending:
+                raise QueueFullError(f"{self.max_pending} jobs are already waiting or running.")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"job_id": job_id, "status": "queued"}
+            self._queue.append((job_id, fn, notify))
+            position = len(self._queue)
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"job-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return job_id, position
+
+    def status(self, job_id):
+        """Returns the status of a job ("queued" with its position, "running", "done" with the result or "failed"
+        with the error), or None if the job is unknown or expired."""
+        with self._condition:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job["status"] == "queued":
+                job["position"] = next(i for i, (queued_id, _, _) in enumerate(self._queue, 1) if queued_id == job_id)
+            return job
+
+    def stats(self):
+        """Returns the number of queued and running jobs."""
+        with self._condition:
+            return {"queued": len(self._queue), "running": self._running, "max_pending": self.max_pending}
+
+    def _expire(self):
+        """Forgets jobs that finished more than `ttl` seconds ago; needs the lock."""
+        deadline = time.monotonic() - self.ttl
+        while self._finished and self._finished[0][0] < deadline:
+            self._jobs.pop(self._finished.popleft()[1], None)
+
+    def _run(self):
+        """Worker loop: runs the oldest queued job and records its outcome."""
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job_id, fn, notify = self._queue.popleft()
+                self._jobs[job_id]["status"] = "running"
+                self._running += 1
+
+            try:
+                status = {"job_id": job_id, "status": "done", "result": fn(job_id)}
+            except Exception as e:
+                status = {"job_id": job_id, "status": "failed", "error": str(e)}
+
+            with self._condition:
+                self._running -= 1
+                self._jobs[job_id] = status
+                self._finished.append((time.monotonic(), job_id))
+            if notify:
+                try:
+                    notify(dict(status))
+                except Exception as e:
+                    print(f"ERROR: Notification of job {job_id} failed: {e}")
@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+
+# Fixed-point precision of Pillow's 8-bit resampling (libImaging/Resample.c)
+PRECISION_BITS = 22
+LANCZOS_SUPPORT = 3.0
+
+THUMBNAIL_SIZE = 245
+OUTPUT_SIZE = 256
+THRESHOLD = 240
+
+
+def canvas_pixels(image):
+    """Returns the pixels of a decoded canvas image as uint8 array [H, W] (L), [H, W, 3] (RGB) or [H, W, 4] (RGBA)."""
+    if image.mode not in ("L", "RGB", "RGBA"):
+        image = image.convert("RGB")  # like ensure_white_background, other modes lose their transparency
+    return np.asarray(image)
+
+
+def lanczos_weights(in_size, out_size):
+    """Returns the LANCZOS weights of a resize from `in_size` to `out_size` pixels as a dense int matrix [in_size, out_size].
+
+    The weights are computed and rounded exactly like Pillow's `precompute_coeffs` and `normalize_coeffs_8bpc`, so
+    a resize with them gives the same pixels as `Image.resize(..., Image.Resampling.LANCZOS)`.
+    """
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = LANCZOS_SUPPORT * filterscale
+    ksize = int(math.ceil(support)) * 2 + 1
+
+    center = (np.arange(out_size) + 0.5) * scale
+    xmin = np.maximum(np.trunc(center - support + 0.5), 0).astype(np.int64)
+    xmax = np.minimum(np.trunc(center + support + 0.5), in_size).astype(np.int64) - xmin
+
+    taps = np.arange(ksize)
+    valid = taps[None, :] < xmax[:, None]
+    x = ((taps[None, :] + xmin[:, None]) - center[:, None] + 0.5) * (1.0 / filterscale)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        px = x * math.pi
+        sinc = np.where(x == 0.0, 1.0, np.sin(px) / px)
+        px3 = (x / 3) * math.pi
+        sinc3 = np.where(x == 0.0, 1.0, np.sin(px3) / px3)
+    weights = np.where(valid & (x >= -3.0) & (x < 3.0), sinc * sinc3, 0.0)
+
+    total = np.zeros(out_size)
+    for tap in range(ksize):  # summed in the order of the C loop
+        total += weights[:, tap]
+    weights = np.where(total[:, None] != 0.0, weights / np.where(total == 0.0, 1.0, total)[:, None], weights)
+    weights = np.trunc(weights * (1 << PRECISION_BITS) + np.where(weights < 0, -0.5, 0.5))
+
+    matrix = np.zeros((in_size, out_size))
+    rows = (taps[None, :] + xmin[:, None])[valid]
+    matrix[rows, np.nonzero(valid)[0]] = weights[valid]
+    return matrix
+
+
+def resample_axis(pixels, weights, axis):
+    """Resizes uint8 pixels along one axis ([..., H, W], axis -1 or -2) with `lanczos_weights`, rounding like Pillow."""
+    # Products and sums of 8-bit values and 22-bit weights are integers far below 2**53, so float64 is exact
+    if axis == -1:
+        result = pixels.astype(np.float64) @ weights
+    else:
+        result = np.swapaxes(np.swapaxes(pixels.astype(np.float64), -1, -2) @ weights, -1, -2)
+    result = np.floor((result + (1 << (PRECISION_BITS - 1))) / (1 << PRECISION_BITS))
+    return np.clip(result, 0, 255).astype(np.uint8)
+
+
+def thumbnail_size(width, height, size=THUMBNAIL_SIZE):
+    """Returns the size of `Image.thumbnail((size, size))` for an image of width x height."""
+    if size >= width and size >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    x, y = size, size
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def bounding_box(mask):
+    """Returns the (row, column) slices of the True pixels of a 2D mask from row and column `any` reductions, None if there are none."""
+    rows = mask.any(axis=1)
+    if not rows.any():
+        return None
+    top, bottom = rows.argmax(), len(rows) - rows[::-1].argmax()
+    columns = mask[top:bottom].any(axis=0)
+    return slice(top, bottom), slice(columns.argmax(), len(columns) - columns[::-1].argmax())
+
+
+def preprocess_canvas(pixels, size=OUTPUT_SIZE, native=False):
+    """Turns canvas pixels (see `canvas_pixels`) into the black-and-white model input (uint8, 0 or 255), 256x256 by default.
+
+    Gives the same pixels as `process_input_image(ensure_white_background(image))` in a single pass over the
+    array: transparency is blended onto white, the drawing is cropped to the rows and columns that contain
+    pixels with no white channel, scaled into 245x245 with LANCZOS, thresholded and centered on white.
+    A larger `size` scales the box and margin along (490 in 512, 980 in 1024). With `native` the drawing keeps
+    its pixels (only larger ones are scaled into the box of `size`) and gets the same relative margin.
+    """
+    pixels = np.asarray(pixels)
+    if pixels.ndim == 3 and pixels.shape[2] == 4:
+        # One uint32 per pixel (alpha in the high byte): only pixels that are neither opaque white nor fully
+        # transparent (both end up white) can be content, which bounds the area that needs per-channel work
+        packed = np.ascontiguousarray(pixels).view("<u4")[:, :, 0]
+        box = bounding_box((packed != 0xFFFFFFFF) & (packed > 0x00FFFFFF))
+        if box is None:
+            raise ValueError("No content found in the image.")
+        pixels = pixels[box]
+        alpha = pixels[:, :, 3:]
+        pixels = pixels[:, :, :3]
+        if alpha.min() < 255:
+            # background.paste(image, mask=image) onto white: (255 * (255 - a) + v * a) / 255 rounded like Pillow
+            blend = 255 * (255 - alpha.astype(np.uint32)) + pixels * alpha.astype(np.uint32) + 128
+            pixels = (((blend >> 8) + blend) >> 8).astype(np.uint8)
+
+    # Content are the pixels without any white channel (find_bounds)
+    if pixels.ndim == 3:
+        content = (pixels[:, :, 0] < 255) & (pixels[:, :, 1] < 255) & (pixels[:, :, 2] < 255)
+    else:
+        content = pixels < 255
+    box = bounding_box(content)
+    if box is None:
+        raise ValueError("No content found in the image.")
+    crop = pixels[box]
+
+    # Gray drawings (the usual case) are resized as one channel, colored ones per channel and then converted to L
+    if crop.ndim == 3:
+        if (crop[:, :, 0] == crop[:, :, 1]).all() and (crop[:, :, 0] == crop[:, :, 2]).all():
+            crop = crop[:, :, 0]
+        else:
+            crop = np.moveaxis(crop, 2, 0)
+
+    height, width = crop.shape[-2:]
+    new_width, new_height = thumbnail_size(width, height, size * THUMBNAIL_SIZE // OUTPUT_SIZE)
+    if new_width != width:
+        crop = resample_axis(crop, lanczos_weights(width, new_width), -1)
+    if new_height != height:
+        crop = resample_axis(crop, lanczos_weights(height, new_height), -2)
+    if crop.ndim == 3:
+        crop = crop.astype(np.uint32)
+        crop = ((crop[0] * 19595 + crop[1] * 38470 + crop[2] * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+    output_height = output_width = size
+    if native:
+        margin = math.ceil(max(new_width, new_height) * (OUTPUT_SIZE - THUMBNAIL_SIZE) / THUMBNAIL_SIZE)
+        output_height, output_width = new_height + margin, new_width + margin
+    output = np.full((output_height, output_width), 255, dtype=np.uint8)
+    y, x = (output_height - new_height) // 2, (output_width - new_width) // 2
+    output[y:y + new_height, x:x + new_width] = np.where(crop < THRESHOLD, 0, 255)
+    return output
+
+
+def normalize_sketch(sketch):
+    """Returns the model input array [3, H, W] (float32, -1 or 1) of a preprocessed sketch, like `image_to_tensor`."""
+    return np.broadcast_to(np.where(sketch < 128, np.float32(-1.0), np.float32(1.0)), (3,) + sketch.shape).copy()
@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import torch
+
+from interaction.checkpoints import define_generator, load_generator_weights
+from interaction.helpers import repo_dir, model_target, model_memory_budget, model_variants, list_models
+from interaction.variants import EXPORTED_VARIANTS, parse_model_variants, variant_path, load_exported
+
+# The generator architecture lives in the CycleGAN submodule
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+from models import networks  # noqa: E402
+
+
+MODEL_SUFFIX = "_net_G.pth"
+
+
+def model_size_bytes(net):
+    """Returns the memory occupied by the parameters and buffers of a network."""
+    tensors = list(net.parameters()) + list(net.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelRegistry:
+    """Loads generators lazily and keeps the most recently used ones within a RAM budget (in bytes).
+
+    `variants` selects an optimized CPU variant per model (see interaction/variants.py), e.g.
+    "car=int8,butterfly=traced" or "int8" for all. A model whose exported variant is missing or older
+    than its checkpoint is loaded in fp32.
+    """
+
+    def __init__(self, model_dir=model_target, device=None, memory_budget=model_memory_budget, variants=model_variants):
+        self.model_dir = model_dir
+        self.device = torch.device(device or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+        self.memory_budget = memory_budget
+        self.variants = parse_model_variants(variants)
+        self.resident_bytes = 0
+        self._models = OrderedDict()  # model name -> (generator, size in bytes), least recently used first
+        self._versions = {}  # model name -> checkpoint mtime of the resident generator
+        self._lock = threading.Lock()
+        self._loading = {}  # model name -> lock, so a cold load does not block requests for resident models
+
+    def model_path(self, model_name):
+        """Returns the checkpoint path of a model name (e.g. 'car' -> car_net_G.pth)."""
+        return os.path.join(self.model_dir, f"{model_name}{MODEL_SUFFIX}")
+
+    def available_models(self):
+        """Returns the names of all generators in the checkpoint folder."""
+        return list_models(self.model_dir, MODEL_SUFFIX)
+
+    def resident_models(self):
+        """Returns the names of the generators currently held in memory, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def model_variant(self, model_name):
+        """Returns the variant a model is loaded as: the selected one if it is usable on this device, fp32 otherwise."""
+        variant = self.variants.get(model_name, self.variants.get("*", "fp32"))
+        if variant not in ("fp32", "channels_last") and self.device.type != "cpu":
+            return "fp32"
+        if variant in EXPORTED_VARIANTS:
+            path = variant_path(self.model_path(model_name), variant)
+            try:
+                if os.path.getmtime(path) < os.path.getmtime(self.model_path(model_name)):
+                    return "fp32"  # exported from an older checkpoint
+            except OSError:
+                return "fp32"
+        return variant
+
+    def model_version(self, model_name):
+        """Returns the checkpoint mtime of a model (with the variant unless fp32); for resident models the one of the loaded weights."""
+        with self._lock:
+            if model_name in self._versions:
+                return self._versions[model_name]
+        try:
+            mtime = os.path.getmtime(self.model_path(model_name))
+        except OSError:
+            raise ValueError(f"Model {model_name} not found.")
+        variant = self.model_variant(model_name)
+        return mtime if variant == "fp32" else f"{mtime}:{variant}"
+
+    def build_generator(self, model_name):
+        """Builds the ResNet generator and loads the weights of the given model."""
+        path = self.model_path(model_name)
+        if not os.path.exists(path):
+            raise ValueError(f"Model {model_name} not found.")
+
+        net = define_generator(networks)
+        load_generator_weights(net, path, self.device)
+        net.to(self.device)
+        net.eval()
+        for param in net.parameters():
+            param.requires_grad_(False)
+        return net
+
+    def load_variant(self, model_name):
+        """Loads the generator of a model as its variant (see `model_variant`) and returns it with its size in bytes."""
+        variant = self.model_variant(model_name)
+        if variant in EXPORTED_VARIANTS:
+            path = variant_path(self.model_path(model_name), variant)
+            return load_exported(path, variant), os.path.getsize(path)  # frozen graphs hold their weights as constants
+
+        net = self.build_generator(model_name)
+        size = model_size_bytes(net)
+        if variant == "channels_last":
+            net = net.to(memory_format=torch.channels_last)
+        elif variant == "compiled":
+            net = torch.compile(net)  # compiles on the first forward pass (once per batch size)
+        return net, size
+
+    def get(self, model_name):
+        """Returns the generator of a model, loading it on first use and evicting cold models if needed."""
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name][0]
+            loading_lock = self._loading.setdefault(model_name, threading.Lock())
+
+        with loading_lock:
+            with self._lock:  # another request may have loaded it in the meantime
+                if model_name in self._models:
+                    self._models.move_to_end(model_name)
+                    return self._models[model_name][0]
+
+            version = self.model_version(model_name)
+            net, size = self.load_variant(model_name)
+
+            with self._lock:
+                self._models[model_name] = (net, size)
+                self._versions[model_name] = version
+                self.resident_bytes += size
+                self._evict()
+                self._loading.pop(model_name, None)
+        return net
+
+    def _evict(self):
+        """Drops least recently used generators until the budget is met; the newest one always stays."""
+        while self.resident_bytes > self.memory_budget and len(self._models) > 1:
+            name, (_, size) = self._models.popitem(last=False)
+            self._versions.pop(name, None)
+            self.resident_bytes -= size
+            print(f"Model {name} evicted from memory ({size / 2**20:.1f} MB).")
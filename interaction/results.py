@@ -0,0 +1,46 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from interaction.helpers import result_store_size, result_ttl
+
+
+class ResultStore:
+    """Keeps the PNG bytes of finished transformations in memory, addressed by a unique result ID.
+
+    At most `max_results` results are kept, each for at most `ttl` seconds.
+    """
+
+    kinds = ("input", "output")
+
+    def __init__(self, max_results=result_store_size, ttl=result_ttl):
+        self.max_results = max_results
+        self.ttl = ttl
+        self._results = OrderedDict()  # result id -> {"input": bytes, "output": bytes, "time": seconds}, oldest first
+        self._lock = threading.Lock()
+
+    def add(self, input_png, output_png, result_id=None):
+        """Stores a result (under `result_id`, e.g. its job ID, or a new ID) and returns the ID; the oldest results are dropped beyond `max_results`."""
+        result_id = result_id or uuid.uuid4().hex
+        with self._lock:
+            self._results[result_id] = {"input": input_png, "output": output_png, "time": time.monotonic()}
+            self._results.move_to_end(result_id)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result_id
+
+    def get(self, result_id, kind):
+        """Returns the PNG bytes of one image of a result, or None if it is unknown or expired."""
+        with self._lock:
+            self._expire()
+            result = self._results.get(result_id)
+        if result is None or kind not in self.kinds:
+            return None
+        return result[kind]
+
+    def _expire(self):
+        """Drops results older than `ttl` seconds; needs the lock."""
+        deadline = time.monotonic() - self.ttl
+        while self._results and next(iter(self._results.values()))["time"] < deadline:
+            self._results.popitem(last=False)
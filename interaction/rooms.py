@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+from interaction.canvas import CanvasState
+from interaction.helpers import default_room, max_rooms
+
+ROOM_NAME_LENGTH = 64
+
+
+def room_name(name):
+    """Returns a usable room name for user input (stripped, at most 64 characters), the default room otherwise."""
+    name = str(name or "").strip()[:ROOM_NAME_LENGTH]
+    return name or default_room
+
+
+class DrawingRooms:
+    """Keeps track of the drawing room of every client and of one CanvasState per room.
+
+    The canvas of a room outlives its last client, so a reloaded page finds the drawing again. Only
+    the canvases of empty rooms count against `max_rooms`; the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_rooms=max_rooms):
+        self.max_rooms = max_rooms
+        self._rooms = {}  # sid -> room
+        self._members = {}  # room -> number of clients
+        self._canvases = OrderedDict()  # room -> CanvasState, least recently used first
+        self._lock = threading.Lock()
+
+    def join(self, sid, room):
+        """Moves a client into a room (out of its previous one) and returns the room's canvas."""
+        with self._lock:
+            self._leave(sid)
+            self._rooms[sid] = room
+            self._members[room] = self._members.get(room, 0) + 1
+            canvas = self._canvases.get(room)
+            if canvas is None:
+                canvas = self._canvases[room] = CanvasState()
+            self._canvases.move_to_end(room)
+            self._drop_empty_rooms()
+            return canvas
+
+    def leave(self, sid):
+        """Removes a client from its room and returns the room (None if it was in none)."""
+        with self._lock:
+            room = self._leave(sid)
+            self._drop_empty_rooms()
+            return room
+
+    def room_of(self, sid):
+        """Returns the room of a client or None."""
+        with self._lock:
+            return self._rooms.get(sid)
+
+    def canvas(self, room):
+        """Returns the canvas of a room or None if the room is unknown."""
+        with self._lock:
+            return self._canvases.get(room)
+
+    def record(self, room, packed):
+        """Logs a stroke message in the canvas of its room (see CanvasState.append) and tags it with the room."""
+        canvas = self.canvas(room)
+        if canvas is not None:
+            packed = canvas.append(packed)
+        packed["room"] = room
+        return packed
+
+    def stats(self):
+        """Returns the number of clients per room."""
+        with self._lock:
+            return dict(self._members)
+
+    def _leave(self, sid):
+        """Removes a client from its room; needs the lock."""
+        room = self._rooms.pop(sid, None)
+        if room is not None:
+            self._members[room] -= 1
+            if not self._members[room]:
+                del self._members[room]
+        return room
+
+    def _drop_empty_rooms(self):
+        """Drops the least recently used canvases of empty rooms beyond `max_rooms`; needs the lock."""
+        empty = [room for room in self._canvases if room not in self._members]
+        for room in empty[:max(0, len(empty) - self.max_rooms)]:
+            del self._canvases[room]
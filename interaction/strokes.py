@@ -0,0 +1,155 @@
+import math
+import threading
+
+import numpy as np
+
+from interaction.helpers import stroke_tick, stroke_encoding
+
+ENCODINGS = ("float32", "delta")
+DELTA_LIMIT = 2**14 - 1
+
+
+def pack_segments(segments, encoding=stroke_encoding):
+    """Packs polylines [[(x, y), ...], ...] into {"encoding", "lengths", "points"} with the points as one binary buffer.
+
+    "float32" stores the coordinates as little-endian float32 x/y pairs. "delta" rounds them to integers and
+    stores the first point of every polyline and then the differences to the previous point as int16 pairs
+    (coordinates are clipped to +-16383, so every difference fits).
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown stroke encoding {encoding}.")
+    lengths = [len(segment) for segment in segments]
+    points = np.array([point for segment in segments for point in segment], dtype=np.float64).reshape(-1, 2)
+
+    if encoding == "float32":
+        data = points.astype("<f4")
+    else:
+        data = np.clip(np.rint(points), -DELTA_LIMIT, DELTA_LIMIT).astype(np.int64)
+        starts = np.cumsum([0] + lengths[:-1])
+        deltas = np.diff(data, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        deltas[starts] = data[starts]  # every polyline starts absolute
+        data = deltas.astype("<i2")
+    return {"encoding": encoding, "lengths": lengths, "points": data.tobytes()}
+
+
+def unpack_segments(packed):
+    """Reverses `pack_segments`; returns the polylines as list of float arrays [n, 2]."""
+    if packed["encoding"] == "float32":
+        points = np.frombuffer(packed["points"], dtype="<f4").reshape(-1, 2).astype(np.float64)
+    else:
+        points = np.frombuffer(packed["points"], dtype="<i2").reshape(-1, 2).astype(np.float64)
+    segments = np.split(points, np.cumsum(packed["lengths"])[:-1])
+    if packed["encoding"] == "delta":
+        segments = [np.cumsum(segment, axis=0) for segment in segments]
+    return segments
+
+
+def legacy_room(room):
+    """Returns the Socket.IO room of the clients of `room` that get the strokes as 'new_path'/'update_canvas' events."""
+    return f"{room}#legacy"
+
+
+def read_point(data):
+    """Returns the finite (x, y) of a drawing event as floats, or None for malformed data."""
+    try:
+        x, y = float(data["x"]), float(data["y"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (x, y) if math.isfinite(x) and math.isfinite(y) else None
+
+
+class StrokeAggregator:
+    """Coalesces the drawing points of every client into polylines and sends them once per tick.
+
+    Instead of one message per mouse move, each client's points of the last `tick` seconds are sent
+    as one 'draw_segments' message (see `pack_segments`) to the other clients of its room. A polyline
+    is complete on its own: a continued path starts with the last point of the previous tick, a new
+    path with the point of 'start_new_path'. `on_flush(room, message)` (e.g. `DrawingRooms.record`)
+    receives every message before it is sent and returns the message to send.
+
+    Clients that do not announce 'draw_segments' support are registered with `add_legacy_client` and
+    joined to `legacy_room(room)`. They get the same points as one 'new_path' event per polyline and one
+    'update_canvas' event per further point, like before the points were coalesced.
+    """
+
+    def __init__(self, socketio, tick=stroke_tick, encoding=stroke_encoding, on_flush=None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown stroke encoding {encoding}.")
+        self.socketio = socketio
+        self.tick = tick
+        self.encoding = encoding
+        self.on_flush = on_flush
+        self._pending = {}  # (room, sid) -> [polyline, ...] collected in the current tick
+        self._last_point = {}  # sid -> last point of the client's current path
+        self._legacy_clients = {}  # sid -> room of the clients that get 'new_path'/'update_canvas' events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps flushes in order, so a flush returns only after earlier points are sent
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def start_path(self, room, sid, x, y):
+        """Begins a new path of a client at (x, y)."""
+        with self._lock:
+            self._pending.setdefault((room, sid), []).append([(x, y)])
+            self._last_point[sid] = (x, y)
+        self._schedule()
+
+    def add_point(self, room, sid, x, y):
+        """Continues the current path of a client to (x, y)."""
+        with self._lock:
+            segments = self._pending.setdefault((room, sid), [])
+            if not segments:
+                last_point = self._last_point.get(sid)
+                segments.append([last_point] if last_point else [])
+            segments[-1].append((x, y))
+            self._last_point[sid] = (x, y)
+        self._schedule()
+
+    def add_legacy_client(self, room, sid):
+        """Sends the strokes of `room` also as legacy events (the client must be in `legacy_room(room)`)."""
+        with self._lock:
+            self._legacy_clients[sid] = room
+
+    def remove(self, sid):
+        """Ends the path of a client that left its room; its pending points are still sent with the next tick."""
+        with self._lock:
+            self._last_point.pop(sid, None)
+            self._legacy_clients.pop(sid, None)
+
+    def flush(self, after=None):
+        """Sends all pending polylines now; `after` runs before any later flush (e.g. to send a reset in order)."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                legacy_rooms = set(self._legacy_clients.values())
+            for (room, sid), segments in pending.items():
+                packed = pack_segments(segments, self.encoding)
+                if self.on_flush:
+                    packed = self.on_flush(room, packed)
+                self.socketio.emit('draw_segments', packed, to=room, skip_sid=sid)
+                if room in legacy_rooms:
+                    self.emit_legacy(legacy_room(room), sid, segments)
+            if after:
+                after()
+
+    def emit_legacy(self, to, sid, segments):
+        """Sends polylines point by point: 'new_path' with the first point, then 'update_canvas' for every further one."""
+        for segment in segments:
+            for i, (x, y) in enumerate(segment):
+                self.socketio.emit('update_canvas' if i else 'new_path', {"x": x, "y": y}, to=to, skip_sid=sid)
+
+    def _schedule(self):
+        """Wakes the background task, which is started with the first point."""
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = self.socketio.start_background_task(self._run)
+        self._wakeup.set()
+
+    def _run(self):
+        """Background task: waits for points, lets them gather for one tick and sends them."""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self.socketio.sleep(self.tick)
+            self.flush()
@@ -0,0 +1,48 @@
+import torch
+
+from interaction.helpers import tile_size, tile_overlap
+
+
+def tile_positions(size, tile=tile_size, overlap=tile_overlap):
+    """Returns the start offsets of overlapping tiles that cover `size` pixels (the last tile ends at the border)."""
+    if size <= tile:
+        return [0]
+    stride = tile - overlap
+    positions = list(range(0, size - tile, stride))
+    return positions + [size - tile]
+
+
+def blend_window(tile=tile_size, overlap=tile_overlap):
+    """Returns the weights [tile, tile] of a tile output: 1 in the middle, falling linearly towards the edges over `overlap` pixels."""
+    ramp = torch.clamp((torch.arange(tile, dtype=torch.float32) + 1) / (overlap + 1), max=1)
+    ramp = torch.minimum(ramp, ramp.flip(0))
+    return ramp[:, None] * ramp[None, :]
+
+
+def needs_tiles(tensor):
+    """Returns whether an input [1, 3, H, W] is generated in tiles: all but the 256x256 sketches of the training data
+    (one pass over another size would also change the size of the output unless it is divisible by 4)."""
+    return tuple(tensor.shape[2:]) != (256, 256)
+
+
+def generate_tiled(tensor, run_tiles, tile=tile_size, overlap=tile_overlap):
+    """Runs a large input [1, 3, H, W] through a generator tile by tile and blends the tiles into the output [3, H, W].
+
+    `run_tiles(tiles)` transforms a list of tiles [1, 3, tile, tile] into their outputs [3, tile, tile], e.g. in
+    batches, so peak memory depends on the tile size and batch size but not on the size of the image. Tiles
+    overlap by `overlap` pixels and are cross-faded with `blend_window`, which hides the seams between tiles
+    (every tile is normalized on its own by the InstanceNorm layers). Inputs smaller than a tile are padded with white.
+    """
+    _, channels, height, width = tensor.shape
+    padded = torch.nn.functional.pad(tensor, (0, max(0, tile - width), 0, max(0, tile - height)), value=1.0)
+    ys, xs = tile_positions(padded.shape[2], tile, overlap), tile_positions(padded.shape[3], tile, overlap)
+    positions = [(y, x) for y in ys for x in xs]
+    fakes = run_tiles([padded[:, :, y:y + tile, x:x + tile] for y, x in positions])
+
+    window = blend_window(tile, overlap)
+    output = torch.zeros(channels, padded.shape[2], padded.shape[3])
+    weights = torch.zeros(padded.shape[2], padded.shape[3])
+    for (y, x), fake in zip(positions, fakes):
+        output[:, y:y + tile, x:x + tile] += fake.float().cpu() * window
+        weights[y:y + tile, x:x + tile] += window
+    return (output / weights)[:, :height, :width]
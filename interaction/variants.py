@@ -0,0 +1,57 @@
+import os
+
+import torch
+
+# fp32: the checkpoint as trained; channels_last and compiled are applied when the model is loaded;
+# traced and int8 are files written by export_cpu_models.py next to the checkpoint
+VARIANTS = ("fp32", "channels_last", "compiled", "traced", "int8")
+EXPORTED_VARIANTS = ("traced", "int8")
+
+
+def parse_model_variants(spec):
+    """Parses "int8" (all models) or "car=int8,butterfly=traced" into {model name or "*": variant}."""
+    variants = {}
+    for item in filter(None, (part.strip() for part in str(spec or "").split(","))):
+        name, _, variant = item.rpartition("=")
+        variant = variant.strip()
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown model variant {variant}, use one of {', '.join(VARIANTS)}.")
+        variants[name.strip() or "*"] = variant
+    return variants
+
+
+def variant_path(model_path, variant):
+    """Returns the file of an exported variant of a checkpoint (e.g. car_net_G.pth -> car_net_G.int8.pt)."""
+    return f"{os.path.splitext(model_path)[0]}.{variant}.pt"
+
+
+def export_traced(net, example):
+    """Traces a generator into a frozen TorchScript graph (fp32, same output up to float rounding)."""
+    with torch.inference_mode():
+        return torch.jit.freeze(torch.jit.trace(net.eval(), example))
+
+
+def export_int8(net, calibration, example, batch_size=8):
+    """Quantizes a generator statically to int8 (FX graph mode, x86 backend) and traces it.
+
+    The activation ranges are observed on `calibration`, a batch of sketches [N, 3, H, W] in -1..1. The
+    residual blocks, convolutions and InstanceNorm layers run quantized; the result is a TorchScript graph.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = "x86"
+    prepared = prepare_fx(net.eval(), get_default_qconfig_mapping("x86"), example_inputs=(example,))
+    with torch.inference_mode():
+        for start in range(0, len(calibration), batch_size):
+            prepared(calibration[start:start + batch_size])
+    quantized = convert_fx(prepared)
+    return export_traced(quantized, example)
+
+
+def load_exported(path, variant):
+    """Loads an exported variant for the CPU."""
+    net = torch.jit.load(path, map_location="cpu")
+    if variant == "traced":
+        net = torch.jit.optimize_for_inference(net)  # fuses for the local CPU, so it is not done before saving
+    return net
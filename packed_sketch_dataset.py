@@ -0,0 +1,190 @@
+"""
+Packed Sketch Dataset
+
+Sketches are strictly black and white, yet as PNG files the data loader has to open and decode every
+file again in each epoch. This module packs a folder of sketches into a single bit-packed shard file
+(1 bit per pixel, 8 KB for a 256x256 sketch) that is read through a memory map, so an image costs one
+`np.unpackbits` and the operating system shares the pages between all data loader workers.
+
+The file can be used in two ways:
+1. As script to export a folder of sketches (e.g. `trainA` created by `prepare_ndjson.py`) into a shard.
+2. As dataset for the CycleGAN repository. Copy it into `Orginal_CycleGAN_Repository/data` and train with
+   `--dataset_mode packed_sketch`. Domain A is then read from `<dataroot>/<phase>A.shard`, domain B from
+   the usual `<phase>B` image folder.
+
+## Usage:
+    python packed_sketch_dataset.py <image_folder> <shard_path> --threshold <threshold>
+
+### Parameters:
+- `<image_folder>`: Folder with the sketch images (e.g. `Orginal_CycleGAN_Repository/datasets/car/trainA`).
+- `<shard_path>`: Output file (e.g. `Orginal_CycleGAN_Repository/datasets/car/trainA.shard`).
+- `--threshold`: (Optional) Gray values at or above the threshold are stored as white. Defaults to 128.
+
+### Example:
+    python packed_sketch_dataset.py Orginal_CycleGAN_Repository/datasets/car/trainA Orginal_CycleGAN_Repository/datasets/car/trainA.shard
+    python train.py --dataroot ./datasets/car --name car_cyclegan --model cycle_gan --dataset_mode packed_sketch
+
+## File format (little endian):
+- Header: magic `SKSHARD1`, height, width, count and bytes per image (uint32 each), followed by the
+  offsets of the index, the names and the image data (uint64 each) and the length of the names (uint64).
+- Index: one uint64 offset per image, relative to the start of the image data.
+- Names: JSON list with the original file names, in the order of the images.
+- Image data: each image as `np.packbits` of its row-major pixels, 1 = white, 0 = black.
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+
+import numpy as np
+import torch
+from PIL import Image
+
+try:
+    from data.base_dataset import BaseDataset, get_transform
+    from data.image_folder import make_dataset
+except ImportError:  # used as export script outside of the CycleGAN repository
+    BaseDataset = torch.utils.data.Dataset
+    get_transform = make_dataset = None
+
+
+MAGIC = b"SKSHARD1"
+HEADER = struct.Struct("<8sIIIIQQQQ")  # magic, height, width, count, bytes per image, index/names/data offset, names length
+DATA_ALIGNMENT = 64
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".tif", ".tiff")
+
+
+def write_shard(image_folder, shard_path, threshold=128):
+    """Packs all images of a folder (sorted by name) into a shard file and returns the number of images."""
+    names = sorted(f for f in os.listdir(image_folder) if f.lower().endswith(IMG_EXTENSIONS))
+    if not names:
+        raise ValueError(f"No images found in {image_folder}.")
+
+    width, height = Image.open(os.path.join(image_folder, names[0])).size
+    bytes_per_image = (height * width + 7) // 8
+    names_block = json.dumps(names).encode("utf-8")
+    index_offset = HEADER.size
+    names_offset = index_offset + 8 * len(names)
+    data_offset = -(-(names_offset + len(names_block)) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+    offsets = np.arange(len(names), dtype="<u8") * bytes_per_image
+
+    with open(shard_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, height, width, len(names), bytes_per_image,
+                            index_offset, names_offset, data_offset, len(names_block)))
+        f.write(offsets.tobytes())
+        f.write(names_block)
+        f.write(b"\0" * (data_offset - f.tell()))
+        for name in names:
+            image = Image.open(os.path.join(image_folder, name)).convert("L")
+            if image.size != (width, height):
+                raise ValueError(f"{name} has size {image.size}, expected {(width, height)}.")
+            f.write(np.packbits(np.asarray(image) >= threshold).tobytes())
+    return len(names)
+
+
+class SketchShard:
+    """Read-only view on a shard file; images are unpacked on access straight from the memory map."""
+
+    def __init__(self, shard_path):
+        self.path = shard_path
+        self._data = np.memmap(shard_path, dtype=np.uint8, mode="r")
+        (magic, self.height, self.width, count, self.bytes_per_image,
+         index_offset, names_offset, self.data_offset, names_length) = HEADER.unpack(self._data[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f"{shard_path} is not a sketch shard.")
+        self.offsets = np.frombuffer(self._data, dtype="<u8", count=count, offset=index_offset)
+        self.names = json.loads(self._data[names_offset:names_offset + names_length].tobytes())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def packed(self, index):
+        """Returns the packed bytes of an image as a view into the memory map (no copy)."""
+        start = self.data_offset + int(self.offsets[index])
+        return self._data[start:start + self.bytes_per_image]
+
+    def bits(self, index):
+        """Returns an image as uint8 array [H, W] with 1 = white and 0 = black."""
+        return np.unpackbits(self.packed(index), count=self.height * self.width).reshape(self.height, self.width)
+
+    def image(self, index):
+        """Returns an image as black-and-white PIL image in mode RGB, like it was stored before packing."""
+        return Image.fromarray(self.bits(index) * np.uint8(255)).convert("RGB")
+
+    def __getitem__(self, index):
+        """Returns an image as tensor [3, H, W] with -1 (black) and 1 (white), as produced by CycleGANModel.convert_to_black_white."""
+        tensor = torch.from_numpy(self.bits(index)).to(torch.float32).mul_(2).sub_(1)
+        return tensor.unsqueeze(0).expand(3, -1, -1)
+
+
+class PackedSketchDataset(BaseDataset):
+    """
+    Unaligned dataset that reads domain A from a packed sketch shard '<dataroot>/<phase>A.shard'
+    and domain B from the image folder '<dataroot>/<phase>B' (like the unaligned dataset).
+
+    With '--preprocess none' the sketches are used as tensors directly (plus random flipping),
+    otherwise the usual transform of the repository is applied to them.
+    """
+
+    def __init__(self, opt):
+        """Initialize this dataset class.
+
+        Parameters:
+            opt (Option class) -- stores all the experiment flags; needs to be a subclass of BaseOptions
+        """
+        BaseDataset.__init__(self, opt)
+        self.dir_A = os.path.join(opt.dataroot, opt.phase + 'A')
+        self.dir_B = os.path.join(opt.dataroot, opt.phase + 'B')
+        self.shard_A = SketchShard(self.dir_A + '.shard')
+        self.B_paths = sorted(make_dataset(self.dir_B, opt.max_dataset_size))
+        self.A_size = min(len(self.shard_A), opt.max_dataset_size)
+        self.B_size = len(self.B_paths)
+        btoA = self.opt.direction == 'BtoA'
+        self.input_nc = self.opt.output_nc if btoA else self.opt.input_nc
+        output_nc = self.opt.input_nc if btoA else self.opt.output_nc
+        self.transform_A = get_transform(self.opt, grayscale=(self.input_nc == 1))
+        self.transform_B = get_transform(self.opt, grayscale=(output_nc == 1))
+
+    def __getitem__(self, index):
+        """Return a data point and its metadata information.
+
+        Parameters:
+            index (int) -- a random integer for data indexing
+
+        Returns a dictionary that contains A, B, A_paths and B_paths
+        """
+        index_A = index % self.A_size
+        A_path = os.path.join(self.dir_A, self.shard_A.names[index_A])
+        if self.opt.preprocess == 'none':
+            A = self.shard_A[index_A][:self.input_nc]
+            if not self.opt.no_flip and random.random() < 0.5:
+                A = A.flip(-1)
+        else:
+            A = self.transform_A(self.shard_A.image(index_A))
+
+        if self.opt.serial_batches:   # make sure index is within then range
+            index_B = index % self.B_size
+        else:   # randomize the index for domain B to avoid fixed pairs.
+            index_B = random.randint(0, self.B_size - 1)
+        B_path = self.B_paths[index_B]
+        B = self.transform_B(Image.open(B_path).convert('RGB'))
+        return {'A': A, 'B': B, 'A_paths': A_path, 'B_paths': B_path}
+
+    def __len__(self):
+        """Return the total number of images in the dataset."""
+        return max(self.A_size, self.B_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packs a folder of black-and-white sketches into a memory-mapped shard file.")
+    parser.add_argument("image_folder", type=str, help="Folder with the sketch images")
+    parser.add_argument("shard_path", type=str, help="Output shard file")
+    parser.add_argument("--threshold", type=int, default=128, help="Gray values at or above this threshold are white")
+
+    args = parser.parse_args()
+    count = write_shard(args.image_folder, args.shard_path, args.threshold)
+    folder_size = sum(os.path.getsize(os.path.join(args.image_folder, f)) for f in os.listdir(args.image_folder))
+    print(f"{count} images packed into {args.shard_path} ({os.path.getsize(args.shard_path) / 2**20:.1f} MB, "
+          f"image folder {folder_size / 2**20:.1f} MB).")
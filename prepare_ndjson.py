@@ -12,20 +12,26 @@ The processed images are intended for training a CycleGAN model.
 ## Usage:
 Run the script from the command line with the following parameters:
 
-    python prepare_ndjson.py <class_name> <image_count> --root_path <root_path>
+    python prepare_ndjson.py <class_name> <image_count> --root_path <root_path> --workers <workers> --renderer <renderer>
 
 ### Parameters:
 - `<class_name>`: Name of the class folder (e.g., `"car"` for car sketches).
 - `<image_count>`: Number of images to process. (e.g. 4000, that is the amount of images that where used in the project.)
 - `--root_path`: (Optional) Path to the dataset directory. Defaults to `Orginal_CycleGAN_Repository/datasets`.
+- `--workers`: (Optional) Number of processes used for rendering. Defaults to the number of CPU cores, `1` renders in the main process.
+- `--renderer`: (Optional) `numpy` (default) rasterizes whole batches of drawings with array operations, `pil` uses the
+  original PIL drawing chain. Both produce identical images (see `python benchmark.py rasterize`).
 
 ### Example:
     python prepare_ndjson.py car 4000 --root_path /path/to/datasets
 
 This processes 4000 car sketches from `/path/to/datasets/car/*.ndjson` and saves the images in `/path/to/datasets/car/trainA`.
+The `.ndjson` files are read line by line in alphabetical order and reading stops as soon as enough drawings were found,
+so even the full QuickDraw class files never have to fit into memory.
 
 ## Output:
-- The generated images are saved in the `trainA` subfolder of the respective class.
+- The generated images are saved in the `trainA` subfolder of the respective class as `image_0.png`, `image_1.png`, ...
+  in the order in which the drawings appear in the files, independent of the number of workers.
 - The drawings are scaled, centered, contrast-enhanced, and converted to black-and-white.
 - The images are ready for use as training data for a CycleGAN model.
 """
@@ -33,6 +39,9 @@ This processes 4000 car sketches from `/path/to/datasets/car/*.ndjson` and saves
 import os
 import json
 import argparse
+import itertools
+from multiprocessing import Pool
+import numpy as np
 from PIL import Image, ImageDraw, ImageEnhance
 
 def load_drawing_data(path):
@@ -42,6 +51,19 @@ def load_drawing_data(path):
     with open(path, 'r') as f:
         return [json.loads(line) for line in f]
 
+def iter_drawing_data(paths):
+    """Yields the drawings of several .ndjson files one by one, parsing each line only when it is needed."""
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File {path} not found.")
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("drawing"):
+                    yield entry["drawing"]
+
 def drawing_to_image(drawing, image_size=(256, 256)):
     """Creates a centered image from a drawing."""
     image = Image.new("RGB", image_size, "white")
@@ -73,6 +95,182 @@ def drawing_to_image(drawing, image_size=(256, 256)):
     image = adjust_image_size(image, image_size)
     return image
 
+def _round_up(values):
+    """ROUND_UP of Pillow's Draw.c for float32 values."""
+    return np.where(values >= 0, np.floor(values + np.float32(0.5)), -np.floor(np.abs(values).astype(np.float64) + 0.5)).astype(np.int64)
+
+def _round_down(values):
+    """ROUND_DOWN of Pillow's Draw.c for float32 values."""
+    return np.where(values >= 0, np.ceil(values - np.float32(0.5)), -np.ceil(np.abs(values).astype(np.float64) - 0.5)).astype(np.int64)
+
+def _roundf(values):
+    """C roundf (halfway cases away from zero), unlike np.round which rounds halfway cases to even."""
+    magnitude = np.abs(values).astype(np.float64)
+    rounded = np.floor(magnitude)
+    rounded += (magnitude - rounded) >= 0.5
+    return np.copysign(rounded, values).astype(np.float32)
+
+def _edge_x(y, x0, y0, dx):
+    """x position of polygon edges at scan line y, evaluated in float32 like Pillow."""
+    return (y - y0).astype(np.float32) * dx + x0.astype(np.float32)
+
+def drawings_to_arrays(drawings, image_size=(256, 256), width=2):
+    """Renders a batch of drawings directly into binary uint8 arrays (0 = black, 255 = white) of shape (N, height, width).
+
+    Gives the same pixels as `drawing_to_image` followed by `adjust_image_size`, `convert_to_black_and_white`
+    and `enhance_contrast` (with the pinned Pillow 11.0.0), but the stroke points and scan lines of all
+    drawings are handled in array operations. Like `ImageDraw.line`, every segment of width > 1 is filled
+    as a polygon with the scan line algorithm of Pillow's `polygon_generic`.
+    """
+    if width < 2:
+        raise ValueError("drawings_to_arrays supports line widths of 2 and more.")
+    img_w, img_h = image_size
+    images = np.full((len(drawings), img_h, img_w), 255, dtype=np.uint8)
+    if not drawings:
+        return images
+
+    strokes = [(path[0], path[1]) for drawing in drawings for path in drawing]
+    stroke_lengths = np.array([len(x) for x, _ in strokes])
+    drawing_points = np.array([sum(len(path[0]) for path in drawing) for drawing in drawings])
+    all_x = np.fromiter(itertools.chain.from_iterable(x for x, _ in strokes), dtype=np.float64, count=stroke_lengths.sum())
+    all_y = np.fromiter(itertools.chain.from_iterable(y for _, y in strokes), dtype=np.float64, count=stroke_lengths.sum())
+    point_drawing = np.repeat(np.arange(len(drawings)), drawing_points)
+
+    # Bounding box, scale and center per drawing, with the same float operations as drawing_to_image
+    drawing_starts = np.concatenate(([0], np.cumsum(drawing_points)[:-1]))
+    min_x, max_x = np.minimum.reduceat(all_x, drawing_starts), np.maximum.reduceat(all_x, drawing_starts)
+    min_y, max_y = np.minimum.reduceat(all_y, drawing_starts), np.maximum.reduceat(all_y, drawing_starts)
+    if np.any(max_x == min_x) or np.any(max_y == min_y):
+        raise ZeroDivisionError("float division by zero")
+    scale = np.minimum((img_w - 10) / (max_x - min_x), (img_h - 10) / (max_y - min_y))
+    x_center = (max_x + min_x) / 2
+    y_center = (max_y + min_y) / 2
+
+    # Transform all points at once; Pillow truncates the coordinates of each segment to int
+    px = ((all_x - x_center[point_drawing]) * scale[point_drawing] + img_w / 2).astype(np.int64)
+    py = ((all_y - y_center[point_drawing]) * scale[point_drawing] + img_h / 2).astype(np.int64)
+
+    # Segments connect consecutive points of the same stroke
+    is_last = np.zeros(len(px), dtype=bool)
+    is_last[np.cumsum(stroke_lengths) - 1] = True
+    first = np.flatnonzero(~is_last)
+    d, x0, y0, x1, y1 = point_drawing[first], px[first], py[first], px[first + 1], py[first + 1]
+    dx, dy = x1 - x0, y1 - y0
+
+    span_d, span_y, span_x0, span_x1 = [], [], [], []
+
+    # Zero length segments are drawn as a single point
+    point = (dx == 0) & (dy == 0)
+    span_d.append(d[point]), span_y.append(y0[point]), span_x0.append(x0[point]), span_x1.append(x0[point])
+    d, x0, y0, x1, y1, dx, dy = (a[~point] for a in (d, x0, y0, x1, y1, dx, dy))
+
+    # Polygon around each segment (ImagingDrawWideLine)
+    hypotenuse = np.hypot(dx, dy)
+    small = (width - 1) / 2.0
+    ratio_max = np.floor(small + 0.5) / hypotenuse
+    ratio_min = np.ceil(small - 0.5) / hypotenuse
+    round_down = lambda f: np.where(f >= 0, np.ceil(f - 0.5), -np.ceil(np.abs(f) - 0.5)).astype(np.int64)
+    dxmin, dxmax = round_down(ratio_min * dy), round_down(ratio_max * dy)
+    dymin, dymax = round_down(ratio_min * dx), round_down(ratio_max * dx)
+    vx = np.stack([x0 - dxmin, x1 - dxmin, x1 + dxmax, x0 + dxmax], axis=1)
+    vy = np.stack([y0 + dymax, y1 + dymax, y1 - dymin, y0 - dymin], axis=1)
+
+    # Edges v0->v1, v1->v2, v2->v3, v3->v0 (add_edge)
+    ex0, ey0 = vx, vy
+    ex1, ey1 = np.roll(vx, -1, axis=1), np.roll(vy, -1, axis=1)
+    e_ymin, e_ymax = np.minimum(ey0, ey1), np.maximum(ey0, ey1)
+    horizontal = ey0 == ey1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        e_dx = np.where(horizontal, np.float32(0), (ex1 - ex0).astype(np.float32) / (ey1 - ey0).astype(np.float32))
+
+    # Horizontal edges are drawn directly
+    span_d.append(np.broadcast_to(d[:, None], horizontal.shape)[horizontal]), span_y.append(e_ymin[horizontal])
+    span_x0.append(np.minimum(ex0, ex1)[horizontal]), span_x1.append(np.maximum(ex0, ex1)[horizontal])
+
+    # The edge table holds the other edges in their original order
+    order = np.argsort(horizontal, axis=1, kind="stable")
+    t_x0, t_y0, t_dx = (np.take_along_axis(a, order, axis=1) for a in (ex0, ey0, e_dx))
+    t_ymin, t_ymax = (np.take_along_axis(a, order, axis=1) for a in (e_ymin, e_ymax))
+    edge_count = (~horizontal).sum(axis=1)
+
+    # Scan lines of every polygon
+    poly_ymin = np.clip(np.minimum(img_h - 1, e_ymin.min(axis=1)), 0, None)
+    poly_ymax = np.clip(np.maximum(0, e_ymax.max(axis=1)), None, img_h)
+    rows = np.clip(poly_ymax - poly_ymin + 1, 0, None)
+    seg = np.repeat(np.arange(len(rows)), rows)
+    y = poly_ymin[seg] + np.arange(rows.sum()) - np.repeat(np.cumsum(rows) - rows, rows)
+
+    # Between the vertices a scan line crosses exactly two edges, which gives one span from the left to the right edge
+    inside = (y[:, None] > e_ymin[seg]) & (y[:, None] < e_ymax[seg])
+    simple = (inside.sum(axis=1) == 2) & ~(y[:, None] == vy[seg]).any(axis=1)
+    s_seg, s_y, s_inside = seg[simple], y[simple], inside[simple]
+    s_x = _edge_x(s_y[:, None], ex0[s_seg], ey0[s_seg], e_dx[s_seg])
+    span_d.append(d[s_seg]), span_y.append(s_y)
+    span_x0.append(_round_up(np.where(s_inside, s_x, np.inf).min(axis=1)))
+    span_x1.append(_round_down(np.where(s_inside, s_x, -np.inf).max(axis=1)))
+
+    # All other scan lines follow polygon_generic step by step
+    seg, y = seg[~simple], y[~simple]
+    y_last = poly_ymax[seg]
+    r_x0, r_y0, r_dx, r_ymin, r_ymax = (a[seg] for a in (t_x0, t_y0, t_dx, t_ymin, t_ymax))
+    r_count = edge_count[seg]
+
+    xx = np.full((len(y), 8), np.nan, dtype=np.float32)
+    j = np.zeros(len(y), dtype=np.int64)
+    index = np.arange(len(y))
+    for i in range(4):
+        active = (i < r_count) & (y >= r_ymin[:, i]) & (y <= r_ymax[:, i])
+        value = _edge_x(y, r_x0[:, i], r_y0[:, i], r_dx[:, i])
+        xx[index[active], j[active]] = value[active]
+        j += active
+
+        # Needed to draw consistent polygons
+        duplicate = active & (y == r_ymax[:, i]) & (y < y_last)
+        xx[index[duplicate], j[duplicate]] = value[duplicate]
+        j += duplicate
+
+        # Connect discontiguous corners; like Pillow 11.0.0 the corrected value is written to xx[k]
+        corner = active & ~duplicate & (r_dx[:, i] != 0) & (_roundf(value) == value)
+        for k in range(i):
+            dx_i, dx_k = r_dx[:, i], r_dx[:, k]
+            candidate = corner & ~(((dx_i > 0) & (dx_k <= 0)) | ((dx_i < 0) & (dx_k >= 0)))
+            at_max = y == r_ymax[:, i]
+            joined = candidate & (((y == r_ymin[:, i]) & (y == r_ymin[:, k])) | (at_max & (y == r_ymax[:, k])))
+            joined &= value == _edge_x(y, r_x0[:, k], r_y0[:, k], dx_k)
+            if not joined.any():
+                continue
+            y_next = y + np.where(y == y_last, -1, 1)
+            adjacent = _edge_x(y_next, r_x0[:, i], r_y0[:, i], dx_i).astype(np.float64)
+            adjacent_other = _edge_x(y_next, r_x0[:, k], r_y0[:, k], dx_k).astype(np.float64)
+            high, low = np.fmax(adjacent, adjacent_other), np.fmin(adjacent, adjacent_other)
+            new_value = np.where(at_max, np.where(dx_i > 0, high + 1, low - 1), np.where(dx_i > 0, low, high + 1))
+            xx[index[joined], k] = new_value[joined].astype(np.float32)
+            corner &= ~joined
+
+    xx[np.arange(8) >= j[:, None]] = np.nan
+    xx.sort(axis=1)
+    row_d = d[seg]
+    for pair in range(4):
+        filled = 2 * pair + 1 < j
+        span_d.append(row_d[filled]), span_y.append(y[filled])
+        span_x0.append(_round_up(xx[filled, 2 * pair])), span_x1.append(_round_down(xx[filled, 2 * pair + 1]))
+
+    # Clip the spans like hline32 and paint their pixels black
+    span_d, span_y = np.concatenate(span_d), np.concatenate(span_y)
+    span_x0, span_x1 = np.concatenate(span_x0), np.concatenate(span_x1)
+    visible = (span_y >= 0) & (span_y < img_h) & (span_x0 < img_w) & (span_x1 >= 0)
+    span_d, span_y = span_d[visible], span_y[visible]
+    span_x0, span_x1 = np.clip(span_x0[visible], 0, None), np.clip(span_x1[visible], None, img_w - 1)
+    lengths = np.clip(span_x1 - span_x0 + 1, 0, None)
+    starts = (span_d * img_h + span_y) * img_w + span_x0
+    pixels = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    images.reshape(-1)[pixels] = 0
+    return images
+
+def drawing_to_array(drawing, image_size=(256, 256), width=2):
+    """Renders a single drawing with `drawings_to_arrays` and returns an array of shape (height, width)."""
+    return drawings_to_arrays([drawing], image_size, width)[0]
+
 def adjust_image_size(image, target_size=(256, 256)):
     """Scales the drawing to fit 256x256 without distortion and centers it."""
     image.thumbnail(target_size, Image.Resampling.LANCZOS)
@@ -92,43 +290,95 @@ def enhance_contrast(image, factor=2):
     enhancer = ImageEnhance.Contrast(image.convert("L"))
     return enhancer.enhance(factor)
 
+def save_drawing_image(drawing, filename, image_size=(256, 256), threshold=128, contrast_factor=2):
+    """Renders a single drawing and saves it as image."""
+    image = drawing_to_image(drawing, image_size)
+    image = convert_to_black_and_white(image, threshold)
+    image = enhance_contrast(image, contrast_factor)
+    image.save(filename)
+
+def _batched(iterable, size):
+    """Yields lists of `size` consecutive items (the last one may be shorter)."""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def _save_drawing_task(task):
+    """Unpacks a task of `save_drawings_parallel`; defined on module level so the process pool can pickle it."""
+    save_drawing_image(*task)
+    return 1
+
+def _save_drawing_batch_task(task):
+    """Renders a batch of drawings with `drawings_to_arrays` and saves them; used by `save_drawings_parallel`."""
+    filenames, drawings, image_size = task
+    for filename, array in zip(filenames, drawings_to_arrays(drawings, image_size)):
+        Image.fromarray(array).save(filename)
+    return len(filenames)
+
 def save_drawing_images(data, target_folder, num_images, image_size=(256, 256), threshold=128, contrast_factor=2):
     """Saves drawings as images."""
     os.makedirs(target_folder, exist_ok=True)
     for i, entry in enumerate(data[:num_images]):
         if "drawing" in entry:
             filename = os.path.join(target_folder, f"image_{i}.png")
-            image = drawing_to_image(entry["drawing"], image_size)
-            image = convert_to_black_and_white(image, threshold)
-            image = enhance_contrast(image, contrast_factor)
-            image.save(filename)
+            save_drawing_image(entry["drawing"], filename, image_size, threshold, contrast_factor)
+
+def save_drawings_parallel(drawings, target_folder, num_images, workers=None, image_size=(256, 256), threshold=128, contrast_factor=2,
+                           renderer="numpy", batch_size=64):
+    """Renders the first `num_images` drawings of an iterable with a process pool and returns the number of saved images.
+
+    The images are named by their position in the iterable, so the result does not depend on the number of workers.
+    The "numpy" renderer draws `batch_size` drawings at once with `drawings_to_arrays`. It produces the same
+    black-and-white images as the "pil" renderer for every threshold below 255 and contrast factor of at least 1.
+    """
+    os.makedirs(target_folder, exist_ok=True)
+    numbered = ((os.path.join(target_folder, f"image_{i}.png"), drawing)
+                for i, drawing in enumerate(itertools.islice(drawings, num_images)))
+
+    if renderer == "numpy":
+        if not (0 <= threshold < 255 and contrast_factor >= 1):
+            raise ValueError("The numpy renderer only supports thresholds below 255 and contrast factors of at least 1.")
+        task_function = _save_drawing_batch_task
+        tasks = (([filename for filename, _ in chunk], [drawing for _, drawing in chunk], image_size)
+                 for chunk in _batched(numbered, batch_size))
+    else:
+        task_function = _save_drawing_task
+        tasks = ((drawing, filename, image_size, threshold, contrast_factor) for filename, drawing in numbered)
+
+    if workers == 1:
+        return sum(map(task_function, tasks))
+    with Pool(workers) as pool:
+        return sum(pool.imap_unordered(task_function, tasks, chunksize=1 if renderer == "numpy" else 32))
 
-def process_ndjson(motif_name, image_count, root_path):
-    """Processes an .ndjson file and saves the images."""
+def process_ndjson(motif_name, image_count, root_path, workers=None, renderer="numpy"):
+    """Streams all .ndjson files of a motif folder and saves the first `image_count` drawings as images."""
     ndjson_folder = os.path.join(root_path, motif_name)
-    ndjson_files = [f for f in os.listdir(ndjson_folder) if f.endswith(".ndjson")]
+    ndjson_files = sorted(f for f in os.listdir(ndjson_folder) if f.endswith(".ndjson"))
     
     if not ndjson_files:
         print(f"No .ndjson file found for {motif_name}.")
         return
     
-    ndjson_path = os.path.join(ndjson_folder, ndjson_files[0])
+    ndjson_paths = [os.path.join(ndjson_folder, f) for f in ndjson_files]
     target_folder = os.path.join(root_path, motif_name, "trainA")
     
     try:
-        data = load_drawing_data(ndjson_path)
+        saved = save_drawings_parallel(iter_drawing_data(ndjson_paths), target_folder, image_count, workers, renderer=renderer)
     except FileNotFoundError as e:
         print(e)
         return
     
-    save_drawing_images(data, target_folder, image_count)
-    print(f"Images for {motif_name} saved in {target_folder}.")
+    if saved < image_count:
+        print(f"Only {saved} drawings found in {len(ndjson_paths)} file(s).")
+    print(f"{saved} images for {motif_name} saved in {target_folder}.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Converts drawings from an .ndjson file into images for CycleGAN.")
     parser.add_argument("motif_name", type=str, help="Name of the motif folder")
     parser.add_argument("image_count", type=int, help="Number of images to process")
     parser.add_argument("--root_path", type=str, default="Orginal_CycleGAN_Repository/datasets", help="Path to the main data directory")
+    parser.add_argument("--workers", type=int, default=None, help="Number of rendering processes (default: all CPU cores)")
+    parser.add_argument("--renderer", type=str, default="numpy", choices=["numpy", "pil"], help="Vectorized NumPy rasterizer or the original PIL drawing chain")
 
     args = parser.parse_args()
-    process_ndjson(args.motif_name, args.image_count, args.root_path)
+    process_ndjson(args.motif_name, args.image_count, args.root_path, args.workers, args.renderer)
@@ -0,0 +1,78 @@
+"""
+Sketch Noise Augmentation
+
+Batched noise for sketch tensors [B, C, H, W] in -1 (black) .. 1 (white), drawn independently for every sample:
+- salt and pepper: each pixel turns white or black with probability `salt_pepper / 2` each, decided by a single
+  uniform random tensor (one value per pixel, shared by the channels);
+- jitter: the sketch is shifted by up to `jitter` pixels in both directions, the uncovered border is white;
+- dropout: square cells of `cell` pixels are erased (white) with probability `dropout`, which removes stroke pieces.
+
+The noise is drawn from an own random generator when a `seed` is given. It can run in the data loader workers
+instead of the training step: every worker process starts its generator from `seed` plus the seed the data
+loader gives the worker, which differs between the workers and is drawn anew each epoch, when the workers are
+started again. So no worker and no epoch repeats the noise of another, and a rerun gets the same noise as long
+as the main process seeds torch the same way (the data loader draws the worker seeds from its generator).
+
+## Usage:
+Copy this file into `Orginal_CycleGAN_Repository/util`. `cached_unaligned_dataset.py` applies it to the sketches
+(domain A) with `--noise_salt_pepper`, `--noise_jitter`, `--noise_dropout` and `--noise_seed`. In own code:
+
+    noise = SketchNoise(salt_pepper=0.05, jitter=4, dropout=0.1, seed=0)
+    noisy = noise(batch)
+
+`python benchmark.py noise` compares the throughput with `CycleGANModel.add_salt_and_pepper_noise` as it was before.
+"""
+
+import os
+
+import torch
+
+
+class SketchNoise:
+    """Adds per-sample salt-and-pepper noise, jitter and stroke dropout to a batch of sketches (see module docstring)."""
+
+    def __init__(self, salt_pepper=0.0, jitter=0, dropout=0.0, cell=8, seed=None):
+        self.salt_pepper = salt_pepper
+        self.jitter = jitter
+        self.dropout = dropout
+        self.cell = cell
+        self.seed = seed
+        self._generator = None
+        self._pid = None
+
+    def generator(self, device):
+        """Returns the random generator of this process (None for the global one if there is no seed)."""
+        if self.seed is None:
+            return None
+        if self._generator is None or self._pid != os.getpid():  # new data loader worker
+            worker = torch.utils.data.get_worker_info()
+            self._generator = torch.Generator(device).manual_seed((self.seed + (worker.seed if worker else 0)) % 2**63)
+            self._pid = os.getpid()
+        return self._generator
+
+    def __call__(self, batch):
+        """Returns `batch` [B, C, H, W] with noise, as a new tensor if any noise is switched on."""
+        generator = self.generator(batch.device)
+        count, _, height, width = batch.shape
+        if self.jitter > 0:
+            batch = self.shift(batch, generator)
+        if self.dropout > 0:
+            cells = (-(-height // self.cell), -(-width // self.cell))
+            erased = torch.rand((count, 1) + cells, generator=generator, device=batch.device) < self.dropout
+            erased = erased.repeat_interleave(self.cell, 2).repeat_interleave(self.cell, 3)[:, :, :height, :width]
+            batch = batch.masked_fill(erased, 1.0)
+        if self.salt_pepper > 0:
+            # One uniform value per pixel: the lowest salt_pepper / 2 of the range are salt, the highest pepper.
+            # Clamping to [1, 1] or [-1, -1] applies both in one pass over the batch.
+            uniform = torch.rand(count, 1, height, width, generator=generator, device=batch.device)
+            lower = (uniform < self.salt_pepper / 2).to(batch.dtype).mul_(2).sub_(1)
+            upper = (uniform < 1 - self.salt_pepper / 2).to(batch.dtype).mul_(2).sub_(1)
+            batch = batch.clamp(lower, upper)
+        return batch
+
+    def shift(self, batch, generator):
+        """Shifts every sample by its own random offset of up to `jitter` pixels and fills the border with white."""
+        count, _, height, width = batch.shape
+        padded = torch.nn.functional.pad(batch, (self.jitter,) * 4, value=1.0)
+        offsets = torch.randint(0, 2 * self.jitter + 1, (count, 2), generator=generator, device=batch.device).tolist()
+        return torch.stack([padded[i, :, top:top + height, left:left + width] for i, (top, left) in enumerate(offsets)])
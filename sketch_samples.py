@@ -0,0 +1,58 @@
+"""
+Sketch Samples
+
+Sketches for the tools that run generators outside of training: random QuickDraw-like drawings, the test images
+of a dataset folder and the calibration sketches of `export_cpu_models.py`, which are either of them.
+Used by `evaluate.py`, `export_cpu_models.py` and `benchmark.py`; torch and PIL are only imported when needed.
+"""
+
+import os
+import random
+
+import numpy as np
+
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".tif", ".tiff")
+IMAGE_SIZE = 256  # test.py resizes the test images to crop_size
+
+
+def random_drawings(count, seed=0):
+    """Creates QuickDraw-like drawings (strokes as random walks on a 256x256 grid)."""
+    rng = random.Random(seed)
+    drawings = []
+    while len(drawings) < count:
+        drawing = []
+        for _ in range(rng.randint(1, 8)):
+            x, y = [rng.randint(0, 255)], [rng.randint(0, 255)]
+            for _ in range(rng.randint(1, 20)):
+                x.append(min(255, max(0, x[-1] + rng.randint(-40, 40))))
+                y.append(min(255, max(0, y[-1] + rng.randint(-40, 40))))
+            drawing.append([x, y])
+        # Drawings without width or height cannot be scaled
+        if len({v for path in drawing for v in path[0]}) > 1 and len({v for path in drawing for v in path[1]}) > 1:
+            drawings.append(drawing)
+    return drawings
+
+
+def load_test_images(dataroot, num_test):
+    """Loads the first `num_test` test images (sorted like the single dataset) as tensor [N, 3, H, W] in -1..1."""
+    import torch
+    from PIL import Image
+
+    names = sorted(f for f in os.listdir(dataroot) if f.lower().endswith(IMG_EXTENSIONS))[:num_test]
+    images = np.stack([np.asarray(Image.open(os.path.join(dataroot, name)).convert("RGB")
+                                  .resize((IMAGE_SIZE, IMAGE_SIZE), Image.BICUBIC)) for name in names])
+    tensor = torch.from_numpy(images).permute(0, 3, 1, 2).float().div_(255).sub_(0.5).div_(0.5)
+    return [os.path.splitext(name)[0] for name in names], tensor
+
+
+def load_sketches(folder, count, seed=0):
+    """Returns `count` sketches as tensor [N, 3, 256, 256] in -1..1, from an image folder or as random strokes."""
+    if folder:
+        return load_test_images(folder, count)[1]
+
+    import torch
+    from prepare_ndjson import drawings_to_arrays
+
+    arrays = drawings_to_arrays(random_drawings(count, seed))
+    tensor = torch.from_numpy(arrays.astype(np.float32) / 127.5 - 1.0)
+    return tensor.unsqueeze(1).expand(-1, 3, -1, -1).contiguous()